@@ -0,0 +1,62 @@
+'''Benchmark of the numeric backends.
+
+Usage: python benchmarks/bench_backends.py [n] [repeats]
+
+Each expression below is parsed with every backend (and the decimal backend at
+two precisions) and its plan is evaluated in-process with evaluate_plan, so
+the times do not include starting the evaluation process. The best time of a
+few runs is shown.
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'pycalc'))
+
+from backends import get_backend  # noqa: E402
+from parser import Parser  # noqa: E402
+from tree import evaluate_plan  # noqa: E402
+
+backends = [('standard',), ('float',), ('fraction',), ('decimal',),
+            ('decimal', 50)]
+
+# Expressions, with {n} standing for the size given on the command line
+expressions = ['sum(1/k^2, k, 1, {n})',
+               'sum(k^2 - 3*k + 2, k, 1, {n})',
+               'prod(1 + 1/k^2, k, 1, {n})',
+               'integrate(exp(-x^2), x, 0, 3)',
+               'sum(|k - {n}/2| * 2.5, k, 1, {n})']
+
+
+def elapsed(plan, backend, repeats):
+    '''Return the shortest time it takes to evaluate a plan.'''
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        evaluate_plan(plan, {}, backend)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def main():
+    n = sys.argv[1] if len(sys.argv) > 1 else '10000'
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    names = list(str(get_backend(*args)) for args in backends)
+    lines = list(expression.format(n=n) for expression in expressions)
+    width = max(len(line) for line in lines)
+    print(' ' * width, ''.join('{:>22}'.format(name) for name in names))
+    for line in lines:
+        times = []
+        for args in backends:
+            backend = get_backend(*args)
+            parser = Parser([], 'ans', backend)
+            parser.parse(line)
+            times.append(elapsed(parser.tree.plan(), backend, repeats))
+        print('{:<{}}'.format(line, width),
+              ''.join('{:>21.4f}s'.format(t) for t in times))
+
+
+if __name__ == '__main__':
+    main()
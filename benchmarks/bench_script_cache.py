@@ -0,0 +1,65 @@
+'''Benchmark of running a script with and without its cached plans.
+
+Usage: python benchmarks/bench_script_cache.py [lines] [repeats]
+
+A script with the given number of lines is written to a temporary directory
+and run with the "run" command, first without a cache (cold) and then with
+the cache written by the first run (warm). The time of starting and quitting
+PyCalc without running anything is measured as well and subtracted.
+'''
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+pycalc = os.path.join(root, 'pycalc')
+
+
+def script_lines(n):
+    '''Return n lines of a script, each using the variable of the line before
+    it.'''
+    lines = ['x0 = 1']
+    for i in range(1, n):
+        lines.append('x{} = (x{} + {}) * 3 ^ 2 / |{} - 7.5| - '
+                     'exp(-{} / 1000)'.format(i, i - 1, i, i, i))
+    return lines
+
+
+def run(directory, commands):
+    '''Run PyCalc with the given commands and return the time it took.'''
+    start = time.perf_counter()
+    subprocess.run([sys.executable, pycalc], input='\n'.join(commands),
+                   cwd=directory, stdout=subprocess.DEVNULL, check=True,
+                   universal_newlines=True)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, 'script.pc')
+        cache = os.path.join(directory, '.script.pc.pycalccache')
+        with open(script, 'w') as file:
+            file.write('\n'.join(script_lines(n)) + '\n')
+        startup = min(run(directory, ['quit']) for _ in range(repeats))
+        cold = []
+        warm = []
+        for _ in range(repeats):
+            if os.path.exists(cache):
+                os.remove(cache)
+            cold.append(run(directory, ['run ' + script, 'quit']))
+            warm.append(run(directory, ['run ' + script, 'quit']))
+    cold = min(cold) - startup
+    warm = min(warm) - startup
+    print('lines:   {}'.format(n))
+    print('startup: {:.3f}s'.format(startup))
+    print('cold:    {:.3f}s ({:.1f}us per line)'.format(cold, cold / n * 1e6))
+    print('warm:    {:.3f}s ({:.1f}us per line)'.format(warm, warm / n * 1e6))
+    print('speedup: {:.2f}x'.format(cold / warm))
+
+
+if __name__ == '__main__':
+    main()
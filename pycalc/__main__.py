@@ -11,14 +11,31 @@ prompt = '>>> '
 
 help_str = '''Enter arithmetic expressions at the prompt.
 
+Expressions that take a while to evaluate keep running in the background, and
+their results are printed when they are ready. Meanwhile, more expressions can
+be entered; they are evaluated in the order they were entered.
+
 Special commands:
     quit
         Exit the program.
     vars
         View the stored variables.
+    show (variable)*
+        View the full values of the given variables (by default, ans).
+        Otherwise, very large numbers are abbreviated.
     del (pattern)*
         Delete all variables matching one of the given patterns.
         If no pattern is specified, delete all variables.
+    run (file)
+        Evaluate the lines of a file, one after the other.
+    jobs
+        View the expressions that are being evaluated or waiting to be.
+    cancel (job)*
+        Cancel the given jobs. If no job is specified, cancel all jobs.
+    backend (name (digits)?)?
+        Switch to the numeric backend with the given name (standard, float,
+        fraction, or decimal with the given number of significant digits).
+        If no name is specified, view the current backend.
     help
         View this help message.'''
 
@@ -32,13 +49,32 @@ if os.path.isfile(var_fname):
 # Initialize the PyCalc interpreter
 pycalc = PyCalcInterpreter(intro, prompt, help_str, variables)
 
-if len(sys.argv) > 1:
+args = sys.argv[1:]
+if args[:1] == ['--backend']:
+    # pycalc --backend name [digits] expression
+    args.pop(0)
+    backend_args = args[:1]
+    del args[:1]
+    # Only the decimal backend takes an argument (its precision).
+    if backend_args == ['decimal'] and args and args[0].isdigit():
+        backend_args.append(args.pop(0))
+    try:
+        pycalc.set_backend(*backend_args)
+    except Exception as ex:
+        print('Runtime error:', 'No backend specified.' if not backend_args
+              else str(ex))
+        pycalc.close()
+        sys.exit(1)
+
+if args:
     # If there are command-line arguments, treat them as an expression and
     # try to evaluate it.
-    pycalc.onecmd(' '.join(sys.argv[1:]))
+    pycalc.timeout = None
+    pycalc.onecmd(' '.join(args))
 else:
     # Otherwise, enter interactive mode.
     pycalc.cmdloop()
+pycalc.close()
 
 # Save the updated variables to the disk
 with open(var_fname, 'wb') as file:
@@ -0,0 +1,275 @@
+'''Module containing the numeric backends of PyCalc.
+
+A backend decides how number literals are read, which functions carry out the
+operations and functions of the language, and the values of the constants:
+
+standard
+    Integer literals are Python ints and other literals are floats.
+float
+    Every number is a float, so no time is spent on integer arithmetic or on
+    mixing ints and floats.
+fraction
+    Numbers are exact fractions. Irrational functions and constants give
+    floats.
+decimal
+    Numbers are decimals with a fixed number of significant digits.
+'''
+from decimal import Context, Decimal, localcontext
+from fractions import Fraction
+from functools import lru_cache
+from math import e, pi, exp, log, cos, sin, tan, factorial, fabs
+from math import pow as float_pow
+from operator import add, sub, mul, truediv, pow, neg
+
+
+class Backend(object):
+    '''Standard numeric backend. Subclasses override the lookup tables and the
+    methods below.'''
+    name = 'standard'
+
+    # Whether the numbers of the backend are something other than floats
+    # (which matters for numerical integration).
+    exact = False
+
+    # Names of the constants (known without computing their values)
+    constant_names = ['e', 'pi']
+
+    def __init__(self):
+        # Binary operation lookup table (prevents looking at cases later).
+        self.bin_ops = {
+                        '+': add,
+                        '-': sub,
+                        '*': mul,
+                        '/': truediv,
+                        '^': pow
+                        }
+        # Function lookup table (also prevents looking at cases later).
+        self.functions = {
+                          '-': neg,
+                          'abs': abs,
+                          'exp': exp,
+                          'log': log,
+                          'cos': cos,
+                          'sin': sin,
+                          'tan': tan,
+                          '!': factorial
+                          }
+        self._constants = None
+
+    @property
+    def constants(self):
+        '''Lookup table of the constants. It is only built when it is first
+        needed, since computing e and pi to many digits takes a while.'''
+        if self._constants is None:
+            self._constants = self.make_constants()
+        return self._constants
+
+    def make_constants(self):
+        return {'e': e, 'pi': pi}
+
+    def int_number(self, token):
+        '''Convert an integer literal to a number.'''
+        return int(token)
+
+    def float_number(self, token):
+        '''Convert a floating-point literal to a number.'''
+        return float(token)
+
+    def from_int(self, value):
+        '''Convert an int (like the index of a sum) to a number.'''
+        return value
+
+    def from_float(self, value):
+        '''Convert a float to a number (only needed if floats cannot be mixed
+        with the numbers of the backend).'''
+        return value
+
+    def from_value(self, value):
+        '''Convert a value computed with any backend (like a stored variable)
+        to a number that can be mixed with the numbers of this backend.'''
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
+
+    def __reduce__(self):
+        # Backends are pickled by name, so that unpickling reuses the cached
+        # backend.
+        return get_backend, (self.name,)
+
+    def __str__(self):
+        return self.name
+
+
+class FloatBackend(Backend):
+    name = 'float'
+
+    def __init__(self):
+        super().__init__()
+        # math.pow and math.fabs always return floats.
+        self.bin_ops['^'] = float_pow
+        self.functions['abs'] = fabs
+        self.functions['!'] = float_factorial
+
+    def int_number(self, token):
+        return float(token)
+
+    def from_int(self, value):
+        return float(value)
+
+    def from_value(self, value):
+        if isinstance(value, float):
+            return value
+        return float(value)
+
+
+class FractionBackend(Backend):
+    name = 'fraction'
+    exact = True
+
+    def __init__(self):
+        super().__init__()
+        self.functions['!'] = self.factorial
+
+    def int_number(self, token):
+        return Fraction(int(token))
+
+    def float_number(self, token):
+        return Fraction(token)
+
+    def from_int(self, value):
+        return Fraction(value)
+
+    def from_value(self, value):
+        if isinstance(value, Decimal):
+            return Fraction(value)
+        return value
+
+    def factorial(self, value):
+        return Fraction(exact_factorial(value))
+
+
+class DecimalBackend(Backend):
+    name = 'decimal'
+    exact = True
+
+    def __init__(self, precision=28):
+        super().__init__()
+        self.precision = precision
+        # A single context is created per precision and its methods are used
+        # directly, instead of setting up a local context for every operation.
+        self.context = context = Context(prec=precision)
+        self.bin_ops = {
+                        '+': context.add,
+                        '-': context.subtract,
+                        '*': context.multiply,
+                        '/': context.divide,
+                        '^': context.power
+                        }
+        self.functions = {
+                          '-': context.minus,
+                          'abs': context.abs,
+                          'exp': context.exp,
+                          'log': context.ln,
+                          'cos': self.float_function(cos),
+                          'sin': self.float_function(sin),
+                          'tan': self.float_function(tan),
+                          '!': self.factorial
+                          }
+
+    def make_constants(self):
+        return {'e': self.context.exp(1), 'pi': decimal_pi(self.context)}
+
+    def int_number(self, token):
+        return self.context.create_decimal(token)
+
+    def float_number(self, token):
+        return self.context.create_decimal(token)
+
+    def from_int(self, value):
+        # Not rounded to the precision, so that large indices stay distinct.
+        return Decimal(value)
+
+    def from_float(self, value):
+        return self.context.create_decimal_from_float(value)
+
+    def from_value(self, value):
+        # The operations of the context accept ints and decimals, but neither
+        # floats nor fractions.
+        if isinstance(value, float):
+            return self.from_float(value)
+        elif isinstance(value, Fraction):
+            return self.context.divide(Decimal(value.numerator),
+                                       Decimal(value.denominator))
+        return value
+
+    def float_function(self, function):
+        '''Make a decimal version of a function of floats.'''
+        def decimal_function(value):
+            return self.from_float(function(float(value)))
+        return decimal_function
+
+    def factorial(self, value):
+        return self.context.plus(exact_factorial(value))
+
+    def __reduce__(self):
+        return get_backend, (self.name, self.precision)
+
+    def __str__(self):
+        return self.name + ' (' + str(self.precision) + ' digits)'
+
+
+def float_factorial(value):
+    '''Factorial of a float with an integral value.'''
+    if value != int(value):
+        raise ValueError('factorial() only accepts integral values')
+    return float(factorial(int(value)))
+
+
+def exact_factorial(value):
+    '''Factorial of an exact number with an integral value.'''
+    if value != int(value):
+        raise ValueError('factorial() only accepts integral values')
+    return factorial(int(value))
+
+
+def decimal_pi(context):
+    '''Compute pi to the precision of a decimal context (this is the recipe
+    from the documentation of the decimal module).'''
+    with localcontext(context) as local:
+        local.prec += 2
+        three = Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+    return context.plus(s)
+
+
+# Backend lookup table
+backends = {
+            'standard': Backend,
+            'float': FloatBackend,
+            'fraction': FractionBackend,
+            'decimal': DecimalBackend
+            }
+
+
+# Created backends by description, so that asking for a backend with or
+# without its default arguments gives the same backend.
+created_backends = {}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name, *args):
+    '''Return the backend with the given name (and arguments, like the
+    precision of the decimal backend). Backends are created only once.'''
+    if name not in backends:
+        raise ValueError('Unknown backend: ' + name)
+    try:
+        backend = backends[name](*args)
+    except TypeError:
+        raise ValueError('Illegal arguments for the ' + name + ' backend')
+    return created_backends.setdefault(str(backend), backend)
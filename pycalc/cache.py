@@ -0,0 +1,131 @@
+'''Module containing the PlanCache class for caching parsed script lines.'''
+import json
+import os
+from hashlib import sha256
+
+from lang import version
+from tree import free_variables
+
+
+class PlanCache(object):
+    '''On-disk cache of the parsed lines of a script, stored in a file next to
+    the script (much like Python's .pyc files).
+
+    Each entry is a (names, plan, free_vars) triple, where names are the
+    variables the line assigns to, plan is the postfix plan of its expression,
+    and free_vars are the variables the expression uses. Entries are keyed by a
+    hash of the line, the PyCalc version and the numeric backend (which decides
+    the values of number literals), so editing a line only invalidates the
+    entry of that line.
+
+    The cache is stored as JSON, with number literals as strings which are
+    read again by the backend, so that loading a cache file that came with a
+    script cannot run any code (unlike unpickling it).
+    '''
+    def __init__(self, script):
+        directory, name = os.path.split(script)
+        self.path = os.path.join(directory, '.' + name + '.pycalccache')
+        self.entries = {}
+        self.used = {}
+        try:
+            with open(self.path) as file:
+                entries = json.load(file)
+            if isinstance(entries, dict):
+                self.entries = entries
+        except Exception:
+            # A missing, unreadable or corrupt cache is simply rebuilt.
+            pass
+
+    def key(self, line, backend):
+        key = version + '\n' + str(backend) + '\n' + line
+        return sha256(key.encode()).hexdigest()
+
+    def get(self, line, backend):
+        '''Return the entry for a line parsed with the given backend, or None
+        if it is not cached.'''
+        key = self.key(line, backend)
+        stored = self.entries.get(key)
+        if stored is None:
+            return None
+        try:
+            names, steps, free_vars = stored
+            entry = (list(check_names(names)), decode_plan(steps, backend),
+                     list(check_names(free_vars)))
+        except Exception:
+            # A corrupt entry is simply replaced.
+            return None
+        self.used[key] = stored
+        return entry
+
+    def put(self, line, backend, names, tree):
+        '''Cache a line parsed with the given backend and return its entry.'''
+        plan = tree.plan()
+        free_vars = free_variables(plan)
+        self.used[self.key(line, backend)] = names, encode_plan(plan), free_vars
+        return names, plan, free_vars
+
+    def save(self):
+        '''Write the entries of the lines looked up since the cache was loaded
+        back to the disk, dropping the entries of lines that are gone.'''
+        if self.used.keys() == self.entries.keys():
+            return
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(self.used, file)
+            os.replace(temp_path, self.path)
+        except OSError:
+            # Not being able to cache is not an error.
+            pass
+
+
+def encode_plan(plan):
+    '''Convert a postfix plan to nested lists of strings.'''
+    steps = []
+    for kind, item in plan:
+        if kind == 'value':
+            # Only the standard backend tells int and float literals apart.
+            literal = 'int' if isinstance(item, int) else 'float'
+            steps.append([kind, literal, str(item)])
+        elif kind == 'range':
+            name, index, body, free_vars = item
+            steps.append([kind, name, index, encode_plan(body), free_vars])
+        else:
+            steps.append([kind, item])
+    return steps
+
+
+def decode_plan(steps, backend):
+    '''Convert nested lists of strings made by encode_plan back to a postfix
+    plan, reading number literals with the given backend. Raise an exception
+    if the lists are not a valid plan.'''
+    plan = []
+    for step in steps:
+        kind = step[0]
+        if kind == 'value':
+            _, literal, string = step
+            check_names([string])
+            if literal == 'int':
+                plan.append((kind, backend.int_number(string)))
+            else:
+                plan.append((kind, backend.float_number(string)))
+        elif kind == 'range':
+            _, name, index, body, free_vars = step
+            check_names([name, index])
+            plan.append((kind, (name, index, decode_plan(body, backend),
+                                list(check_names(free_vars)))))
+        elif kind in ('variable', 'unary', 'binary'):
+            _, item = step
+            check_names([item])
+            plan.append((kind, item))
+        else:
+            raise ValueError('Illegal plan step: ' + str(kind))
+    return plan
+
+
+def check_names(names):
+    '''Raise an exception unless names is a list of strings.'''
+    if not isinstance(names, list) or \
+            not all(isinstance(name, str) for name in names):
+        raise ValueError('Illegal cache entry')
+    return names
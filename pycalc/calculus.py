@@ -0,0 +1,213 @@
+'''Module containing the numerical routines behind the sum, prod and integrate
+functions.
+
+Each routine takes the body of the function compiled to a Python function of
+the index variable, a vectorized version of the body (or None), the bounds of
+the index, and the numeric backend. The indices are passed to the body as
+numbers of the backend. The vectorized body is applied to whole chunks of
+indices at once. It is only used if NumPy is installed.
+'''
+from functools import reduce
+from heapq import heappop, heappush
+from math import fsum, isfinite
+from operator import add
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Function lookup table for vectorized bodies (None without NumPy).
+if numpy is not None:
+    vector_functions = {
+                        '-': numpy.negative,
+                        'abs': numpy.abs,
+                        'exp': numpy.exp,
+                        'log': numpy.log,
+                        'cos': numpy.cos,
+                        'sin': numpy.sin,
+                        'tan': numpy.tan
+                        }
+else:
+    vector_functions = None
+
+# Number of indices handled at once.
+chunk_size = 2 ** 16
+
+# Nodes and weights of the 15-point Gauss-Kronrod rule on [-1, 1] (only the
+# nonnegative nodes are listed). The 7-point Gauss rule used to estimate the
+# error uses every other node, starting at the second one.
+kronrod_nodes = [0.991455371120812639206854697526329,
+                 0.949107912342758524526189684047851,
+                 0.864864423359769072789712788640926,
+                 0.741531185599394439863864773280788,
+                 0.586087235467691130294144845693013,
+                 0.405845151377397166906606412076961,
+                 0.207784955007898467600689403773245,
+                 0.000000000000000000000000000000000]
+kronrod_weights = [0.022935322010529224963732008058970,
+                   0.063092092629978553290700663189204,
+                   0.104790010322250183839876322541518,
+                   0.140653259715525918745189590510238,
+                   0.169004726639267902826583426598550,
+                   0.190350578064785409913256402421014,
+                   0.204432940075298892414161999234649,
+                   0.209482141084727828012999174891714]
+gauss_weights = [0.129484966168869693270611432679082,
+                 0.279705391489276667901467771423780,
+                 0.381830050505118944950369775488975,
+                 0.417959183673469387755102040816327]
+
+
+def accurate_sum(values, plus=add):
+    '''Add up values without losing precision: integers (and other exact
+    numbers) are added exactly with the given addition function, and floats
+    are added with math.fsum.'''
+    values = list(values)
+    if any(isinstance(value, float) for value in values) and \
+            all(isinstance(value, (int, float)) for value in values):
+        return fsum(values)
+    elif plus is add:
+        return sum(values)
+    return reduce(plus, values, 0)
+
+
+def index_range(name, lower, upper):
+    '''Return the range of integers from lower to upper (inclusive).'''
+    try:
+        if lower != int(lower) or upper != int(upper):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('The bounds of ' + name + ' must be integers.')
+    return range(int(lower), int(upper) + 1)
+
+
+def chunks(indices):
+    '''Split a range into consecutive ranges of at most chunk_size indices.'''
+    for start in range(indices.start, indices.stop, chunk_size):
+        yield range(start, min(start + chunk_size, indices.stop))
+
+
+def vector_terms(vectorized, chunk):
+    '''Evaluate a vectorized body on a chunk of indices. Return None if any of
+    the results is not a finite float, in which case the chunk has to be
+    evaluated term by term (to get Python's exact results or exceptions).'''
+    indices = numpy.arange(chunk.start, chunk.stop, dtype=numpy.float64)
+    with numpy.errstate(all='ignore'):
+        try:
+            terms = vectorized(indices)
+        except Exception:
+            return None
+    terms = numpy.broadcast_to(terms, indices.shape)
+    if terms.dtype != numpy.float64 or not numpy.isfinite(terms).all():
+        return None
+    return terms
+
+
+def summation(function, vectorized, lower, upper, backend):
+    '''Compute function(lower) + function(lower + 1) + ... + function(upper).'''
+    plus = backend.bin_ops['+']
+    number = backend.from_int
+    indices = index_range('sum', lower, upper)
+    if not indices:
+        return number(0)
+    # Only float-valued bodies are worth vectorizing: the vectorized body
+    # computes with floats, while integer terms should be added exactly.
+    if vectorized is None or \
+            not isinstance(function(number(indices[0])), float):
+        vectorized = None
+    partial_sums = []
+    for chunk in chunks(indices):
+        terms = None
+        if vectorized is not None:
+            terms = vector_terms(vectorized, chunk)
+        if terms is not None:
+            # NumPy adds up arrays by pairwise summation.
+            partial_sums.append(float(terms.sum()))
+        else:
+            partial_sums.append(accurate_sum(map(function, map(number, chunk)),
+                                             plus))
+    return accurate_sum(partial_sums, plus)
+
+
+def product(function, vectorized, lower, upper, backend):
+    '''Compute function(lower) * function(lower + 1) * ... * function(upper).'''
+    times = backend.bin_ops['*']
+    number = backend.from_int
+    indices = index_range('prod', lower, upper)
+    if not indices:
+        return number(1)
+    if vectorized is None or \
+            not isinstance(function(number(indices[0])), float):
+        vectorized = None
+    partial_products = []
+    for chunk in chunks(indices):
+        terms = None
+        if vectorized is not None:
+            terms = vector_terms(vectorized, chunk)
+        if terms is not None:
+            partial_products.append(float(terms.prod()))
+        else:
+            partial_products.append(reduce(times,
+                                           map(function, map(number, chunk))))
+    return reduce(times, partial_products)
+
+
+def kronrod(function, a, b):
+    '''Integrate a function over [a, b] with the 15-point Gauss-Kronrod rule.
+    Return the integral and an estimate of its error.'''
+    center = (a + b) / 2
+    half_length = (b - a) / 2
+    kronrod_sum = kronrod_weights[-1] * function(center)
+    gauss_sum = gauss_weights[-1] * function(center)
+    for i in range(len(kronrod_nodes) - 1):
+        offset = half_length * kronrod_nodes[i]
+        value = function(center - offset) + function(center + offset)
+        kronrod_sum += kronrod_weights[i] * value
+        if i % 2 == 1:
+            gauss_sum += gauss_weights[i // 2] * value
+    error = abs((kronrod_sum - gauss_sum) * half_length)
+    return kronrod_sum * half_length, error
+
+
+def integral(function, vectorized, lower, upper, backend, tolerance=1e-10,
+             max_intervals=2000):
+    '''Integrate a function from lower to upper by adaptive Gauss-Kronrod
+    quadrature. The interval with the largest error estimate is bisected until
+    the total error estimate is small enough.'''
+    a = float(lower)
+    b = float(upper)
+    if a == b:
+        return 0.0
+    estimate, error = kronrod(function, a, b)
+    # Heap of (-error, integral, a, b) for each subinterval
+    intervals = [(-error, estimate, a, b)]
+    total_error = error
+    while True:
+        # A divergent integral eventually overflows (and inf > inf is False,
+        # so the loop would end with an infinite estimate).
+        if not isfinite(estimate) or not isfinite(total_error) or \
+                len(intervals) >= max_intervals:
+            raise ArithmeticError('The integral does not converge.')
+        if total_error <= tolerance * max(1.0, abs(estimate)):
+            break
+        neg_error, part, a, b = heappop(intervals)
+        # Subtract the error of the bisected interval.
+        total_error += neg_error
+        estimate -= part
+        middle = (a + b) / 2
+        for a, b in ((a, middle), (middle, b)):
+            part, error = kronrod(function, a, b)
+            heappush(intervals, (-error, part, a, b))
+            total_error += error
+            estimate += part
+    return fsum(part for _, part, _, _ in intervals)
+
+
+# Range function lookup table
+range_functions = {
+                   'sum': summation,
+                   'prod': product,
+                   'integrate': integral
+                   }
@@ -1,14 +1,16 @@
 from cmd import Cmd
 from itertools import chain
-from math import e, pi
+from os.path import realpath
 from re import compile
+from threading import RLock
 
+from backends import backends, get_backend
+from cache import PlanCache
 from lang import is_variable
 from parser import Parser, ParseException
-from misc import print_iterable, print_table, underline_substring
-
-
-constants = {'e': e, 'pi': pi}
+from misc import format_value, print_iterable, print_table, underline_substring
+from tree import free_variables
+from worker import Worker
 
 
 class PyCalcInterpreter(Cmd):
@@ -19,39 +21,176 @@ class PyCalcInterpreter(Cmd):
         self.prompt = prompt
         self.help_str = help_str
         self.variables = variables
-        illegal_vars = ['del', 'help', 'quit', 'vars', 'EOF']
+        illegal_vars = ['backend', 'cancel', 'del', 'help', 'jobs', 'quit',
+                        'run', 'show', 'vars', 'EOF']
         default_variable = 'ans'
-        self.parser = Parser(illegal_vars, default_variable)
+        # Numeric backend used for number literals, operations and constants
+        self.backend = get_backend('standard')
+        self.parser = Parser(illegal_vars, default_variable, self.backend)
         self.comment = '#'
+        # Seconds to wait for a result before leaving a job in the background
+        # (None means wait until the job is done).
+        self.timeout = 0.5
+        # Guards self.variables and the console against the worker thread.
+        self.lock = RLock()
+        self.worker = Worker(self.prepare, self.finish)
+        # Maps variable names to (value, string) pairs, so that the "vars"
+        # command only renders values that have changed.
+        self.rendered = {}
+        # Paths of the scripts being run (scripts may run other scripts, but
+        # not themselves)
+        self.scripts = set()
 
     def default(self, line):
         '''Evaluate the given expression.'''
         try:
             self.parser.parse(line)
-            self.names = self.parser.names
-            tree = self.parser.tree
-            if tree.set_vars(self.variables) or tree.set_vars(constants):
-                self.value = tree.evaluate()
-                for name in self.names:
-                    self.variables[name] = self.value
+        except Exception as ex:
+            self.print_error(ex)
+            return
+        plan = self.parser.tree.plan()
+        with self.lock:
+            queued = bool(self.worker.pending())
+            job = self.worker.submit(line, self.parser.names, plan,
+                                     free_variables(plan), self.backend)
+            if queued:
+                # Don't keep the prompt waiting for the jobs ahead of this one.
+                job.background = True
+                print('[{}] Queued.'.format(job.number))
+                return
+        self.wait([job])
+
+    def wait(self, jobs):
+        '''Wait for the last of the given jobs for up to self.timeout seconds,
+        then leave the unfinished jobs in the background. Ctrl-C cancels them
+        instead.'''
+        try:
+            jobs[-1].done.wait(self.timeout)
+        except KeyboardInterrupt:
+            self.cancel_jobs(jobs)
+            return
+        with self.lock:
+            # A job may finish between the wait and here, so what counts is
+            # whether finish() has reported it (which it does under the lock).
+            unfinished = list(job.number for job in jobs
+                              if not job.reported and job.status != 'cancelled')
+            for job in jobs:
+                job.background = True
+            if len(unfinished) == 1:
+                print('[{}] Running in the background.'.format(unfinished[0]))
+            elif unfinished:
+                print('[{}-{}] Running in the background.'.format(
+                    unfinished[0], unfinished[-1]))
+
+    def cancel_jobs(self, jobs):
+        '''Cancel the given jobs after Ctrl-C.'''
+        for job in jobs:
+            self.worker.cancel(job)
+        print('\nInterrupted.')
+
+    def prepare(self, job):
+        '''Look up the values of the variables in a job's expression.'''
+        with self.lock:
+            if all(name in self.variables for name in job.free_vars):
+                return dict((name, self.variables[name])
+                            for name in job.free_vars)
+            elif all(name in job.backend.constant_names
+                     for name in job.free_vars):
+                # The values of the constants are looked up by the worker.
+                return None
             else:
                 raise Exception('Encountered unknown variable.')
-            print_iterable(self.names, sep=', ', end=' =\n')
-            print('    ' + str(self.value))
-        except ParseException as ex:
+
+    def finish(self, job):
+        '''Store and print the result of a job.'''
+        with self.lock:
+            job.reported = True
+            if job.background:
+                print()
+                print('[{}] Finished after {:.1f}s: {}'.format(
+                    job.number, job.elapsed(), job.line))
+            try:
+                if job.error is not None:
+                    raise Exception(job.error)
+                for name in job.names:
+                    self.variables[name] = job.value
+                self.print_result(job.names, job.value)
+            except Exception as ex:
+                self.print_error(ex, job.line_number)
+            if job.background:
+                print(self.prompt, end='', flush=True)
+
+    def print_result(self, names, value, full=False):
+        '''Print the names assigned to a value, followed by the value.'''
+        print_iterable(names, sep=', ', end=' =\n')
+        print('    ' + format_value(value, None if full else 100))
+
+    def print_error(self, ex, line_number=None):
+        '''Print an error, with the line of the script it happened on (if
+        any).'''
+        if line_number is None:
             print('Runtime error:', str(ex))
+        else:
+            print('Runtime error on line {}:'.format(line_number), str(ex))
+        if isinstance(ex, ParseException):
             underline_substring(ex.expression, ex.start, ex.end)
-        except KeyboardInterrupt:
-            print('\nInterrupted.')
-        except Exception as ex:
-            print('Runtime error:', str(ex))
 
     def emptyline(self):
         '''Ignore blank lines.'''
         pass
 
+    def do_backend(self, line):
+        '''Show or change the numeric backend.'''
+        if not line:
+            print('Current backend:', self.backend)
+            print_iterable(chain(['Available backends:'], backends.keys()))
+            return
+        try:
+            self.set_backend(*line.split())
+        except Exception as ex:
+            print('Runtime error:', str(ex))
+        else:
+            print('Using the', self.backend, 'backend.')
+
+    def set_backend(self, name, *args):
+        '''Switch to the backend with the given name and arguments (given as
+        strings, as they appear on the command line).'''
+        try:
+            args = list(int(arg) for arg in args)
+        except ValueError:
+            raise ValueError('Illegal arguments for the ' + name + ' backend')
+        backend = get_backend(name, *args)
+        with self.lock:
+            # Queued jobs keep the backend they were submitted with.
+            self.backend = backend
+            self.parser.backend = backend
+
+    def do_cancel(self, line):
+        '''Cancel running or queued jobs.'''
+        jobs = self.worker.pending()
+        if not jobs:
+            print('There are no jobs to cancel.')
+            return
+        numbers = line.split()
+        if numbers:
+            by_number = dict((str(job.number), job) for job in jobs)
+            for number in numbers:
+                if number not in by_number:
+                    print('Runtime error: No such job:', number)
+                    return
+            jobs = list(by_number[number] for number in numbers)
+        cancelled = list(job.number for job in jobs if self.worker.cancel(job))
+        if cancelled:
+            print_iterable(chain(['Cancelled:'], cancelled))
+        else:
+            print('No jobs were cancelled.')
+
     def do_del(self, line):
         '''Delete variables.'''
+        with self.lock:
+            self.delete_variables(line)
+
+    def delete_variables(self, line):
         if self.variables:
             patterns = line.split()
             if len(patterns) == 0:
@@ -87,26 +226,138 @@ class PyCalcInterpreter(Cmd):
         else:
             print(self.help_str)
 
+    def do_jobs(self, line):
+        '''Show the running and queued jobs.'''
+        if line:
+            print('The "jobs" command does not take any arguments.')
+            return
+        jobs = self.worker.pending()
+        if not jobs:
+            print('There are no jobs to show.')
+        else:
+            job_table = [['job', 'status', 'time', 'expression']]
+            for job in jobs:
+                elapsed = '{:.1f}s'.format(job.elapsed())
+                job_table.append([job.number, job.status, elapsed, job.line])
+            print_table(job_table)
+
     def do_quit(self, line):
         '''Exit the program.'''
         if line:
             print('The "quit" command does not take any arguments.')
         else:
-            print('Leaving PyCalc.')
+            self.leave()
             return True
 
+    def do_run(self, line):
+        '''Run a script.'''
+        if not line:
+            print('The "run" command takes a file name.')
+            return
+        try:
+            with open(line) as file:
+                lines = file.readlines()
+        except OSError as ex:
+            print('Runtime error:', ex.strerror + ':', line)
+            return
+        path = realpath(line)
+        if path in self.scripts:
+            print('Runtime error: The script is already running:', line)
+            return
+        self.scripts.add(path)
+        try:
+            self.run_script(line, lines)
+        finally:
+            self.scripts.discard(path)
+
+    def run_script(self, script, lines):
+        '''Evaluate the lines of a script.'''
+        # Expressions are evaluated by the worker like those entered at the
+        # prompt (after them, and in order), so a slow line can be cancelled.
+        cache = PlanCache(script)
+        jobs = []
+        try:
+            for number, script_line in enumerate(lines, 1):
+                script_line = self.precmd(script_line)
+                if not script_line:
+                    continue
+                command = self.parseline(script_line)[0]
+                if hasattr(self, 'do_' + str(command)):
+                    # Commands (like "del" or "backend") have to come after
+                    # the lines before them.
+                    self.finish_jobs(jobs)
+                    self.onecmd(script_line)
+                    continue
+                try:
+                    names, plan, free_vars = self.parse_line(script_line,
+                                                             cache)
+                except Exception as ex:
+                    self.finish_jobs(jobs)
+                    self.print_error(ex, number)
+                    continue
+                jobs.append(self.worker.submit(script_line, names, plan,
+                                               free_vars, self.backend, number))
+        except KeyboardInterrupt:
+            self.cancel_jobs(jobs)
+            return
+        finally:
+            # Every line parsed so far is cached, even if the script was
+            # interrupted.
+            cache.save()
+        if jobs:
+            self.wait(jobs)
+
+    def parse_line(self, line, cache):
+        '''Return the (names, plan, free_vars) entry of a line of a script,
+        using its cached entry if possible.'''
+        # The backend may be changed by the script itself.
+        entry = cache.get(line, self.backend)
+        if entry is None:
+            self.parser.parse(line)
+            entry = cache.put(line, self.backend, self.parser.names,
+                              self.parser.tree)
+        return entry
+
+    def finish_jobs(self, jobs):
+        '''Wait until the given jobs are done.'''
+        for job in jobs:
+            job.done.wait()
+
     def do_vars(self, line):
         '''Show the stored variables.'''
         if line:
             print('The "vars" command does not take any arguments.')
-        elif not self.variables:
-            print('There are no variables to show.')
-        else:
-            var_table = [['name', 'value', 'type']]
-            for name in sorted(self.variables.keys(), key=lambda s: s.lower()):
-                value = self.variables[name]
-                var_table.append([name, value, type(value).__name__])
-            print_table(var_table)
+            return
+        with self.lock:
+            if not self.variables:
+                print('There are no variables to show.')
+            else:
+                var_table = [['name', 'value', 'type']]
+                rendered = {}
+                for name in sorted(self.variables.keys(),
+                                   key=lambda s: s.lower()):
+                    value = self.variables[name]
+                    if name in self.rendered and \
+                            self.rendered[name][0] is value:
+                        rendered[name] = self.rendered[name]
+                    else:
+                        rendered[name] = value, format_value(value, 30)
+                    var_table.append([name, rendered[name][1],
+                                      type(value).__name__])
+                # Forget about deleted variables.
+                self.rendered = rendered
+                print_table(var_table)
+
+    def do_show(self, line):
+        '''Show the full values of variables.'''
+        names = line.split() or [self.parser.default_variable]
+        with self.lock:
+            for name in names:
+                if name not in self.variables:
+                    print('Runtime error: Unknown variable:', name)
+                    return
+            for name in names:
+                self.print_result([name], self.variables[name], full=True)
 
     def do_EOF(self, line):
         '''Exit the program.'''
@@ -114,16 +365,28 @@ class PyCalcInterpreter(Cmd):
         # Unfortunately this makes EOF unusable as a variable name, and any line
         # starting with EOF will exit the program.
         print()
-        print('Leaving PyCalc.')
+        self.leave()
         return True
 
+    def leave(self):
+        '''Cancel any unfinished jobs before exiting the program.'''
+        jobs = self.worker.pending()
+        if jobs:
+            print_iterable(chain(['Cancelled:'], (job.number for job in jobs)))
+        print('Leaving PyCalc.')
+
+    def close(self):
+        '''Stop the background worker.'''
+        self.worker.close()
+
     def cmdloop(self):
-        try:
-            super().cmdloop()
-        except KeyboardInterrupt:
-            print()
-            self.intro=''
-            self.cmdloop()
+        while True:
+            try:
+                super().cmdloop()
+                break
+            except KeyboardInterrupt:
+                print()
+                self.intro = ''
 
     def precmd(self, line):
         '''Strip comments from the line.'''
@@ -1,10 +1,16 @@
 import re
 
 
-reserved_chars = ['=', '+', '-', '*', '/', '^', '(', ')', '|', '!']
+# Version of the PyCalc language (cached plans are only valid for one version)
+version = '1.2'
+
+reserved_chars = ['=', '+', '-', '*', '/', '^', '(', ')', '|', '!', ',']
 
 functions = ['exp', 'log', 'cos', 'sin', 'tan']
 
+# Functions of an expression, an index variable and the range of the index
+range_functions = ['sum', 'prod', 'integrate']
+
 variable_regex = re.compile(r'^[_a-zA-Z]\w*$')
 
 
@@ -12,6 +18,10 @@ def is_function(token):
     return token in functions
 
 
+def is_range_function(token):
+    return token in range_functions
+
+
 def is_variable(token):
     return bool(variable_regex.match(token))
 
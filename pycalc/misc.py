@@ -1,13 +1,73 @@
+import sys
+from fractions import Fraction
+from math import log10
+
+
+def format_value(value, max_digits=100, precision=16):
+    '''Convert a value to a string without spelling out huge integers.
+
+    Converting an integer to decimal takes more than linear time in its number
+    of digits (and newer versions of Python refuse to do it past a limit), so
+    integers with more than max_digits digits are shown in scientific notation
+    instead, with their first precision digits (truncated, not rounded). The
+    numerator and denominator of fractions are abbreviated separately.
+
+    Args:
+        value : object
+            The value to convert.
+        max_digits : int or None (optional)
+            The number of digits beyond which integers are abbreviated. If None,
+            integers are always converted in full.
+        precision : int (optional)
+            The number of significant digits shown for abbreviated integers.
+    '''
+    if isinstance(value, Fraction):
+        numerator = format_value(value.numerator, max_digits, precision)
+        if value.denominator == 1:
+            return numerator
+        denominator = format_value(value.denominator, max_digits, precision)
+        return numerator + '/' + denominator
+    if not isinstance(value, int) or isinstance(value, bool):
+        return str(value)
+    # An integer with b bits has at most this many digits, and at least one
+    # digit less.
+    digits = int(value.bit_length() * log10(2)) + 1
+    if max_digits is None:
+        limit = getattr(sys, 'get_int_max_str_digits', lambda: 0)()
+        if limit and digits > limit:
+            sys.set_int_max_str_digits(0)
+            try:
+                return str(value)
+            finally:
+                sys.set_int_max_str_digits(limit)
+        return str(value)
+    if digits <= max(max_digits, precision):
+        return str(value)
+    # Only the leading digits are needed, which an integer division with a
+    # small quotient computes quickly.
+    power = 10 ** (digits - precision)
+    leading = abs(value) // power
+    if leading < 10 ** (precision - 1):
+        digits -= 1
+        if digits <= max_digits:
+            return str(value)
+        leading = abs(value) // (power // 10)
+    leading = str(leading)
+    sign = '-' if value < 0 else ''
+    return sign + leading[0] + '.' + leading[1:] + '...e+' + str(digits - 1)
+
+
 def print_table(table, sep=' '):
     '''Print a table (a list of lists) with proper column spacing.'''
-    table = list(table)
+    # Convert each item to a string only once.
+    table = list(list(str(item) for item in row) for row in table)
     if table:
         # check if each row in the table has the same number of items
         if min(len(row) for row in table) != max(len(row) for row in table):
             raise Exception('Each row in the table must have the same length')
         max_len = list(0 for _ in table[0])
         for row in table:
-            row_len = list(len(str(item)) for item in row)
+            row_len = list(len(item) for item in row)
             max_len = list(max(a, b) for a, b in zip(max_len, row_len))
 
         format_string = sep.join('{:<' + str(l) + '}' for l in max_len)
@@ -9,18 +9,52 @@ mul_or_div ::= negative (('*'|'/') negative)*
 negative ::= exponent | '-' negative
 exponent ::= factorial | factorial '^' negative
 factorial ::= atom ('!')*
-atom ::= function | variable | int_number | float_number | enclosure
+atom ::= range_function | function | variable | int_number | float_number |
+         enclosure
 enclosure ::= parentheses | absolute_value
 parentheses ::= '(' expr ')'
 absolute_value ::= '|' expr '|'
 function ::= <valid function name> enclosure
+range_function ::= <valid range function name> '(' expr ',' variable ','
+                   expr ',' expr ')'
 variable ::= <valid variable name>
 int_number ::= <int>
 float_number ::= <float>
+
+Rather than descending through one method per rule, the parser below climbs
+operator precedences: operands and operators are shifted onto explicit stacks,
+and an operator is reduced as soon as an operator of lower (or, for left
+associative operators, equal) precedence follows it. The precedences are
+chosen so that the resulting trees are exactly those described by the grammar.
 '''
-from lang import is_float, is_function, is_int, is_variable
+from backends import get_backend
+from lang import is_float, is_function, is_int, is_range_function, is_variable
 from tokenizer import Tokenizer
-from tree import BinaryOperation, UnaryFunction, Value, Variable
+from tree import BinaryOperation, RangeFunction, UnaryFunction, Value, Variable
+
+
+# Binary operator lookup table: symbol -> (precedence, right associative?)
+binary_operators = {
+                    '+': (1, False),
+                    '-': (1, False),
+                    '*': (2, False),
+                    '/': (2, False),
+                    '^': (4, True)
+                    }
+
+# Negation binds tighter than multiplication but looser than exponentiation,
+# so that -2^2 == -(2^2) and 2^-3^2 == 2^(-(3^2)).
+negative_precedence = 3
+
+# Enclosure lookup table: left delimiter -> right delimiter
+enclosures = {
+              '(': ')',
+              '|': '|'
+              }
+
+# Enclosure delimiters are pushed onto the operator stack with this precedence
+# so that no pending operator is ever reduced past them.
+enclosure_precedence = 0
 
 
 class ParseException(Exception):
@@ -38,9 +72,11 @@ class ParseException(Exception):
 
 class Parser(object):
     '''Class for parsing expressions into ASTs.'''
-    def __init__(self, illegal_vars, default_variable):
+    def __init__(self, illegal_vars, default_variable, backend=None):
         self.illegal_vars = illegal_vars
         self.default_variable = default_variable
+        # The numeric backend decides how number literals are read.
+        self.backend = backend or get_backend('standard')
 
     def parse(self, line):
         '''Begin parsing the given line.'''
@@ -63,259 +99,169 @@ class Parser(object):
             if not is_variable(name) or name in self.illegal_vars:
                 raise Exception('Illegal assignment: ' + name +
                                 ' is not a valid variable name')
+        if not self.expression:
+            raise Exception('Illegal assignment: no variable or ' +
+                            'expression specified.')
 
         # Parse expression according to grammar rules
         self.tokenizer = Tokenizer(self.expression)
         self.tree = self.expr()
 
-        # the tokenizer should be out of tokens
-        if self.tokenizer.has_next():
-            token, start, end = next(self.tokenizer)
-            message = 'Dangling tokens starting with ' + token
-            raise ParseException(message, self.expression, token, start, end)
-
-    # Everything below corresponds to the grammar rules described at the top.
-
     def expr(self):
-        '''Rule:
-        expr ::= add_or_sub'''
-        return self.add_or_sub()
-
-    def add_or_sub(self):
-        '''Rule:
-        add_or_sub ::= mul_or_div (("+"|"-") mul_or_div)*'''
-        first_tree = self.mul_or_div()
-        # Arrays for storing successive + or - operations and the tree args.
-        ops = []
-        trees = []
-        # Run until no more + or -'s
-        while True:
-            if self.tokenizer.has_next():
-                self.token, self.start, self.end = self.tokenizer.peek()
-                if self.token in ('+', '-'):
-                    # pop the token off the stack
-                    next(self.tokenizer)
-                    ops.append(self.token)
-                    trees.append(self.mul_or_div())
-                else:
-                    break
-            else:
-                break
-        if trees:
-            # Combine the trees (left-associative)
-            result_tree = first_tree
-            for op, tree in zip(ops, trees):
-                result_tree = BinaryOperation(op, result_tree, tree)
-            return result_tree
-        else:
-            return first_tree
-
-    def mul_or_div(self):
-        '''Rule:
-        mul_or_div ::= negative (("*"|"/") negative)*'''
-        first_tree = self.negative()
-        # Arrays for storing successive * or / operations and the tree args.
-        ops = []
-        trees = []
-        # Run until no more * or /'s
-        while True:
-            if self.tokenizer.has_next():
-                self.token, self.start, self.end = self.tokenizer.peek()
-                if self.token in ('*', '/'):
-                    # pop the token off the stack
-                    next(self.tokenizer)
-                    ops.append(self.token)
-                    trees.append(self.negative())
-                else:
-                    break
-            else:
-                break
-        if trees:
-            # Combine the trees (left-associative)
-            result_tree = first_tree
-            for op, tree in zip(ops, trees):
-                result_tree = BinaryOperation(op, result_tree, tree)
-            return result_tree
-        else:
-            return first_tree
-
-    def negative(self):
-        '''Rule:
-        negative ::= exponent | "-" negative'''
-        if self.tokenizer.has_next():
-            # Check for leading minus sign
-            self.token, self.start, self.end = self.tokenizer.peek()
-            if self.token == '-':
-                next(self.tokenizer)
-                tree = self.negative()
-                return UnaryFunction('-', tree)
+        '''Parse the whole expression, one token at a time.'''
+        # Operands are ASTs. Operators are (precedence, symbol, unary) triples,
+        # and open enclosures are (enclosure_precedence, delimiter, call)
+        # triples, where call is None, or a list holding the name of the
+        # function applied to the enclosure followed by the arguments parsed so
+        # far.
+        self.operands = []
+        self.operators = []
+        expect_operand = True
+        for self.token, self.start, self.end in self.tokenizer:
+            if expect_operand:
+                expect_operand = self.operand()
             else:
-                return self.exponent()
-            pass
-        else:
-            # There should still be tokens on the stack at this point.
-            message = 'Expected token after ' + self.token
-            expression = self.expression
-            token = self.token
-            start = self.start
-            end = self.end
-            raise ParseException(message, expression, token, start, end)
+                expect_operand = self.operator()
 
-    def exponent(self):
-        '''Rule:
-        exponent ::= factorial | factorial "^" negative'''
-        left_tree = self.factorial()
-        if self.tokenizer.has_next():
-            self.token, self.start, self.end = self.tokenizer.peek()
-            if self.token == '^':
-                next(self.tokenizer)
-                right_tree = self.negative()
-                return BinaryOperation('^', left_tree, right_tree)
-        return left_tree
-
-    def factorial(self):
-        '''Rule:
-        factorial ::= atom ("!")*'''
-        first_tree = self.atom()
-        num_factorial = 0
-        # Run until no more !'s
-        while True:
-            if self.tokenizer.has_next():
-                self.token, self.start, self.end = self.tokenizer.peek()
-                if self.token == '!':
-                    next(self.tokenizer)
-                    num_factorial += 1
-                else:
-                    break
-            else:
-                break
-        if num_factorial:
-            result_tree = first_tree
-            for _ in range(num_factorial):
-                result_tree = UnaryFunction('!', result_tree)
-            return result_tree
-        else:
-            return first_tree
-
-    def atom(self):
-        '''Rule:
-        atom ::= function | variable | int_number | float_number | enclosure'''
-        if self.tokenizer.has_next():
-            self.token, self.start, self.end = self.tokenizer.peek()
-            if is_function(self.token):
-                return self.function()
-            elif is_variable(self.token):
-                return self.variable()
-            elif is_int(self.token):
-                return self.int_number()
-            elif is_float(self.token):
-                return self.float_number()
-            else:
-                return self.enclosure()
-        else:
-            # There should still be tokens on the stack at this point.
+        # There should not be any tokens missing at this point.
+        if expect_operand:
             message = 'Expected token after ' + self.token
-            line = self.expression
-            token = self.token
-            start = self.start
-            end = self.end
-            raise ParseException(message, line, token, start, end)
+            self.error(message)
+        delimiter = self.reduce_enclosure()
+        if delimiter == '(':
+            self.error('Expected closing parenthesis after ' + self.token)
+        elif delimiter == '|':
+            self.error('Expected closing absolute value delimiter '
+                       'after ' + self.token)
+        return self.operands.pop()
 
-    def enclosure(self):
-        '''Rule:
-        enclosure ::= parentheses | absolute_value'''
-        if self.tokenizer.has_next():
-            self.token, self.start, self.end = self.tokenizer.peek()
-            if self.token == '(':
-                # Pop the token off.
-                next(self.tokenizer)
-                return self.parentheses()
-            elif self.token == '|':
-                # Pop the token off.
-                next(self.tokenizer)
-                return self.absolute_value()
-            else:
-                message = 'Expected left delimiter, but found ' + self.token
-                expression = self.expression
-                token = self.token
-                start = self.start
-                end = self.end
-                raise ParseException(message, expression, token, start, end)
+    def operand(self):
+        '''Handle a token where an operand is expected. Return whether an
+        operand is still expected afterwards.'''
+        token = self.token
+        if token == '-':
+            # negative ::= '-' negative
+            self.operators.append((negative_precedence, token, True))
+            return True
+        elif is_range_function(token):
+            # range_function ::= <valid range function name> '(' expr ','
+            #                    variable ',' expr ',' expr ')'
+            if not self.tokenizer.has_next():
+                self.error('Expected opening parenthesis after ' + token)
+            self.token, self.start, self.end = next(self.tokenizer)
+            if self.token != '(':
+                self.error('Expected opening parenthesis, but found ' +
+                           self.token)
+            self.operators.append((enclosure_precedence, '(', [token]))
+            return True
+        elif is_function(token):
+            # function ::= <valid function name> enclosure
+            if not self.tokenizer.has_next():
+                self.error('Expected delimited expression after ' + token)
+            self.token, self.start, self.end = next(self.tokenizer)
+            if self.token not in enclosures:
+                self.error('Expected left delimiter, but found ' + self.token)
+            self.operators.append((enclosure_precedence, self.token, [token]))
+            return True
+        elif is_variable(token):
+            if token in self.illegal_vars:
+                self.error('Illegal variable name: ' + token)
+            self.operands.append(Variable(token))
+            return False
+        elif is_int(token):
+            self.operands.append(Value(self.backend.int_number(token)))
+            return False
+        elif is_float(token):
+            self.operands.append(Value(self.backend.float_number(token)))
+            return False
+        elif token in enclosures:
+            # enclosure ::= parentheses | absolute_value
+            self.operators.append((enclosure_precedence, token, None))
+            return True
         else:
-            # There should still be tokens on the stack at this point.
-            message = 'Expected delimited expression after ' + self.token
-            expression = self.expression
-            token = self.token
-            start = self.start
-            end = self.end
-            raise ParseException(message, expression, token, start, end)
+            self.error('Expected left delimiter, but found ' + token)
 
-    def parentheses(self):
-        '''Rule:
-        parentheses ::= "(" expr ")"'''
-        tree = self.expr()
-        if self.tokenizer.has_next():
-            token, start, end = self.tokenizer.peek()
-            if token == ')':
-                next(self.tokenizer)
-                return tree
-            else:
-                error = 'Expected closing parenthesis, but found ' + token
-                raise ParseException(error, self.expression, token, start, end)
-        else:
-            message = 'Expected closing parenthesis after ' + self.token
-            expression = self.expression
-            token = self.token
-            start = self.start
-            end = self.end
-            raise ParseException(message, expression, token, start, end)
+    def operator(self):
+        '''Handle a token following a complete operand. Return whether an
+        operand is expected afterwards.'''
+        token = self.token
+        if token == '!':
+            # factorial ::= atom ('!')*
+            self.operands.append(UnaryFunction('!', self.operands.pop()))
+            return False
+        elif token in binary_operators:
+            precedence, right_associative = binary_operators[token]
+            while self.operators:
+                top = self.operators[-1][0]
+                if top < precedence or \
+                        (top == precedence and right_associative):
+                    break
+                self.reduce()
+            self.operators.append((precedence, token, False))
+            return True
+        elif token == ',' and self.reduce_enclosure() is not None:
+            call = self.operators[-1][2]
+            if call is not None and is_range_function(call[0]) and \
+                    len(call) < 4:
+                argument = self.operands.pop()
+                if len(call) == 2:
+                    # The second argument is the index variable.
+                    if not isinstance(argument, Variable):
+                        self.error('The index of ' + call[0] +
+                                   ' must be a variable')
+                    argument = argument.name
+                call.append(argument)
+                return True
 
-    def absolute_value(self):
-        '''Rule:
-        absolute_value ::= "|" expr "|"'''
-        tree = self.expr()
-        if self.tokenizer.has_next():
-            token, start, end = self.tokenizer.peek()
-            if token == '|':
-                next(self.tokenizer)
-                return UnaryFunction('abs', tree)
+        # Anything else has to close the innermost enclosure.
+        delimiter = self.reduce_enclosure()
+        if delimiter is None:
+            self.error('Dangling tokens starting with ' + token)
+        elif enclosures[delimiter] != token:
+            if delimiter == '(':
+                message = 'Expected closing parenthesis, but found ' + token
             else:
-                error = 'Expected closing absolute value delimiter, '\
+                message = 'Expected closing absolute value delimiter, '\
                     'but found ' + token
-                raise ParseException(error, self.expression, token, start, end)
+            self.error(message)
+        _, _, call = self.operators.pop()
+        if delimiter == '|':
+            self.operands.append(UnaryFunction('abs', self.operands.pop()))
+        if call is None:
+            pass
+        elif is_range_function(call[0]):
+            name, *arguments = call
+            if len(arguments) != 3:
+                self.error(name + ' takes 4 arguments, but ' +
+                           str(len(arguments) + 1) + ' were given')
+            body, index, lower = arguments
+            upper = self.operands.pop()
+            self.operands.append(RangeFunction(name, body, index, lower, upper))
         else:
-            message = 'Expected closing absolute value delimiter '\
-                'after ' + self.token
-            expression = self.expression
-            token = self.token
-            start = self.start
-            end = self.end
-            raise ParseException(message, expression, token, start, end)
+            self.operands.append(UnaryFunction(call[0], self.operands.pop()))
+        return False
 
-    def function(self):
-        '''Rule:
-        function ::= <valid function name> enclosure'''
-        token, _, _ = next(self.tokenizer)
-        tree = self.enclosure()
-        return UnaryFunction(token, tree)
-
-    def variable(self):
-        '''Rule:
-        variable ::= <valid variable name>'''
-        token, start, end = next(self.tokenizer)
-        if token in self.illegal_vars:
-            message = 'Illegal variable name: ' + token
-            raise ParseException(message, self.expression, token, start, end)
-        return Variable(token)
+    def reduce(self):
+        '''Apply the operator on top of the operator stack to its operands.'''
+        _, symbol, unary = self.operators.pop()
+        if unary:
+            self.operands.append(UnaryFunction(symbol, self.operands.pop()))
+        else:
+            right = self.operands.pop()
+            left = self.operands.pop()
+            self.operands.append(BinaryOperation(symbol, left, right))
 
-    def int_number(self):
-        '''Rule:
-        int_number ::= <int>'''
-        token, _, _ = next(self.tokenizer)
-        return Value(int(token))
+    def reduce_enclosure(self):
+        '''Reduce all operators inside the innermost open enclosure, and return
+        its left delimiter (or None if there is no open enclosure).'''
+        while self.operators:
+            precedence, delimiter, _ = self.operators[-1]
+            if precedence == enclosure_precedence:
+                return delimiter
+            self.reduce()
+        return None
 
-    def float_number(self):
-        '''Rule:
-        float_number ::= <float>'''
-        token, _, _ = next(self.tokenizer)
-        return Value(float(token))
+    def error(self, message):
+        '''Raise a ParseException at the current token.'''
+        raise ParseException(message, self.expression, self.token, self.start,
+                             self.end)
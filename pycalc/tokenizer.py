@@ -1,5 +1,3 @@
-from itertools import chain
-
 from lang import reserved_chars
 
 
@@ -29,17 +27,23 @@ class Peeker(object):
     '''
     def __init__(self, iterable):
         self.iterator = iter(iterable)
+        # Holds at most one element that has been peeked at but not consumed.
+        # (Re-chaining the iterator on every peek would nest one more level of
+        # iterators each time, making long inputs quadratic.)
+        self.buffer = []
 
     def __iter__(self):
         return self
 
     def __next__(self):
+        if self.buffer:
+            return self.buffer.pop()
         return next(self.iterator)
 
     def peek(self):
-        peek_value = next(self)
-        self.iterator = chain([peek_value], self.iterator)
-        return peek_value
+        if not self.buffer:
+            self.buffer.append(next(self.iterator))
+        return self.buffer[0]
 
     def has_next(self):
         try:
@@ -50,13 +54,16 @@ class Peeker(object):
 
 
 def generate_tokens(line, start=0):
-    if start < len(line):
+    '''Yield (token, start, end) triples for the tokens of a line.'''
+    # This is a loop rather than a recursive generator so that long lines
+    # neither hit the recursion limit nor pay for nested generators.
+    while start < len(line):
         token = line[start]
         if token == ' ':
-            yield from generate_tokens(line, start + 1)
+            start += 1
         elif token in reserved_chars:
             yield token, start, start + 1
-            yield from generate_tokens(line, start + 1)
+            start += 1
         else:
             end = start + 1
             while end < len(line):
@@ -64,7 +71,7 @@ def generate_tokens(line, start=0):
                     break
                 end += 1
             yield line[start:end], start, end
-            yield from generate_tokens(line, end)
+            start = end
 
 
 class Tokenizer(Peeker):
@@ -1,29 +1,45 @@
 '''Module containg Abstract Syntax Tree (AST) constructors.'''
 from abc import ABCMeta, abstractmethod
-from math import exp, log, cos, sin, tan, factorial
-from operator import add, sub, mul, truediv, pow, neg
+from backends import get_backend
+from calculus import range_functions, vector_functions
 
 
+# The standard backend is used unless another backend is given.
+default_backend = get_backend('standard')
+
 # Binary operation lookup table (prevents looking at cases later).
-bin_ops = {
-           '+': add,
-           '-': sub,
-           '*': mul,
-           '/': truediv,
-           '^': pow
-           }
+bin_ops = default_backend.bin_ops
 
 # Function lookup table (also prevents looking at cases later).
-functions = {
-             '-': neg,
-             'abs': abs,
-             'exp': exp,
-             'log': log,
-             'cos': cos,
-             'sin': sin,
-             'tan': tan,
-             '!': factorial
-             }
+functions = default_backend.functions
+
+# Python source code for binary operations (used to compile plans).
+bin_op_sources = {
+                  '+': '({} + {})',
+                  '-': '({} - {})',
+                  '*': '({} * {})',
+                  '/': '({} / {})',
+                  '^': '({} ** {})'
+                  }
+
+
+def free_variables(plan):
+    '''Return the sorted names of the variables looked up by a postfix plan.'''
+    return sorted(set(item for kind, item in plan if kind == 'variable'))
+
+
+def postorder(tree):
+    '''Iterate over the nodes of a tree in postorder (children before their
+    parent). An explicit stack is used so that arbitrarily deep trees do not
+    hit the recursion limit.'''
+    stack = [(tree, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded or isinstance(node, Leaf):
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((arg, False) for arg in reversed(node.args))
 
 
 class AST(metaclass=ABCMeta):
@@ -46,6 +62,17 @@ class AST(metaclass=ABCMeta):
         # Implemented in subclass.
         pass
 
+    @abstractmethod
+    def step(self):
+        '''Return the step of a postfix plan corresponding to this node.'''
+        # Implemented in subclass.
+        pass
+
+    def plan(self):
+        '''Return a flat postfix plan of the tree. Unlike the tree itself, the
+        plan can be pickled no matter how deep the tree is.'''
+        return [node.step() for node in postorder(self)]
+
     def __repr__(self):
         '''Convert the tree to a string.'''
         return self.postfix()
@@ -61,14 +88,45 @@ class Branch(AST, metaclass=ABCMeta):
 
     def evaluate(self):
         '''Evaluate the children, then apply the function to the results.'''
-        return self.f(*(arg.evaluate() for arg in self.args))
+        values = []
+        for node in postorder(self):
+            if isinstance(node, Leaf):
+                values.append(node.evaluate())
+            else:
+                n = len(node.args)
+                args = values[-n:]
+                del values[-n:]
+                values.append(node.f(*args))
+        return values[0]
 
     def set_vars(self, variables):
-        return all(arg.set_vars(variables) for arg in self.args)
+        return all(node.set_vars(variables) for node in postorder(self)
+                   if isinstance(node, Leaf))
 
     def postfix(self):
-        arguments = ' '.join(arg.postfix() for arg in self.args)
-        return '(' + arguments + ') ' + self.identifier
+        # The pieces of the string are collected in a list and joined once at
+        # the end: concatenating the strings of the children at every level
+        # would copy the deeper levels over and over.
+        pieces = []
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                pieces.append(item)
+            elif isinstance(item, Leaf):
+                pieces.append(item.postfix())
+            else:
+                stack.extend(reversed(item.label()))
+        return ''.join(pieces)
+
+    def label(self):
+        '''Return the postfix representation of the branch as a list of strings
+        and of the ASTs whose representations go in between.'''
+        label = ['(']
+        for arg in self.args:
+            label.extend((arg, ' '))
+        label[-1] = ') ' + self.identifier
+        return label
 
 
 class BinaryOperation(Branch):
@@ -82,6 +140,9 @@ class BinaryOperation(Branch):
         else:
             raise ValueError('Illegal binary operation: ' + op_symbol)
 
+    def step(self):
+        return 'binary', self.identifier
+
 
 class UnaryFunction(Branch):
     '''A type of AST Branch where the node is a unary function and there is only
@@ -94,6 +155,79 @@ class UnaryFunction(Branch):
         else:
             raise ValueError('Illegal function: ' + function_name)
 
+    def step(self):
+        return 'unary', self.identifier
+
+
+class RangeFunction(Branch):
+    '''A type of AST Branch where the node is a function like sum, which
+    evaluates an expression (the body) over a range of values of an index
+    variable. The children are the bounds of the range, followed by the other
+    variables in the body.'''
+    def __init__(self, function_name, body, index, lower, upper):
+        if function_name in range_functions:
+            self.body = body
+            self.index = index
+            plan = body.plan()
+            free_vars = list(name for name in free_variables(plan)
+                             if name != index)
+            function = RangeOperation(function_name, index, plan, free_vars)
+            super().__init__(function, function_name, lower, upper,
+                             *(Variable(name) for name in free_vars))
+        else:
+            raise ValueError('Illegal function: ' + function_name)
+
+    def label(self):
+        lower, upper = self.args[:2]
+        return ['(', self.body, ' ', self.index, ' ', lower, ' ', upper,
+                ') ' + self.identifier]
+
+    def step(self):
+        function = self.f
+        return 'range', (function.name, function.index, function.plan,
+                         function.free_vars)
+
+
+class RangeOperation(object):
+    '''The function computed by a RangeFunction. Its arguments are the bounds of
+    the range, followed by the values of the other variables in the body.
+
+    The body is compiled to a Python function the first time it is needed, and
+    the compiled function is reused from then on.'''
+    def __init__(self, name, index, plan, free_vars, backend=default_backend):
+        self.name = name
+        self.index = index
+        self.plan = plan
+        self.free_vars = free_vars
+        self.backend = backend
+        self.compiled = None
+
+    def __call__(self, lower, upper, *values):
+        backend = self.backend
+        if self.compiled is None:
+            variables = [self.index] + self.free_vars
+            vectorized = None
+            if vector_functions is not None:
+                vectorized = compile_plan(self.plan, variables, backend, True)
+            self.compiled = compile_plan(self.plan, variables, backend), \
+                vectorized
+        function, vectorized = self.compiled
+        function = function(*values)
+        if vectorized is not None:
+            vectorized = vectorized(*values)
+        if self.name == 'integrate' and backend.exact:
+            # Numerical integration is done with floats.
+            body = function
+
+            def function(x):
+                return float(body(backend.from_float(x)))
+            lower = float(lower)
+            upper = float(upper)
+            return backend.from_float(range_functions[self.name](
+                function, vectorized, lower, upper, backend))
+        return range_functions[self.name](function, vectorized, lower, upper,
+                                          backend)
+
 
 class Leaf(AST, metaclass=ABCMeta):
     '''A node on an AST with no children.'''
@@ -116,12 +250,18 @@ class Value(Leaf):
     def __init__(self, value):
         super().__init__(str(value), value)
 
+    def step(self):
+        return 'value', self.value
+
 
 class Variable(Leaf):
     '''A leaf with a variable value.'''
     def __init__(self, name):
         super().__init__(name, None)
 
+    def step(self):
+        return 'variable', self.name
+
     def evaluate(self):
         # Check if the variable name is assigned to a value.
         if self.value is not None:
@@ -137,3 +277,86 @@ class Variable(Leaf):
             return True
         else:
             return False
+
+
+def evaluate_plan(plan, variables, backend=default_backend):
+    '''Evaluate a postfix plan returned by AST.plan() without building a tree,
+    looking up the values of variables in the given dictionary, and carrying
+    out operations with the given backend.'''
+    plan_bin_ops = backend.bin_ops
+    plan_functions = backend.functions
+    # Variables may hold values computed with another backend.
+    from_value = backend.from_value
+    values = []
+    for kind, item in plan:
+        if kind == 'value':
+            values.append(item)
+        elif kind == 'variable':
+            values.append(from_value(variables[item]))
+        elif kind == 'unary':
+            values.append(plan_functions[item](values.pop()))
+        elif kind == 'binary':
+            right = values.pop()
+            values.append(plan_bin_ops[item](values.pop(), right))
+        elif kind == 'range':
+            n = len(item[3]) + 2
+            args = values[-n:]
+            del values[-n:]
+            values.append(RangeOperation(*item, backend=backend)(*args))
+        else:
+            raise ValueError('Illegal plan step: ' + kind)
+    return values.pop()
+
+
+def compile_plan(plan, variables, backend=default_backend, vectorize=False):
+    '''Compile a postfix plan to a Python function. The function takes the
+    values of all but the first of the given variables, and returns a function
+    of the value of the first variable.
+
+    If vectorize is True, the returned function works on NumPy arrays, and None
+    is returned if the plan cannot be vectorized.'''
+    table = vector_functions if vectorize else backend.functions
+    namespace = {}
+    sources = []
+    for kind, item in plan:
+        name = '_' + str(len(namespace))
+        if kind == 'value':
+            namespace[name] = item
+            sources.append(name)
+        elif kind == 'variable':
+            sources.append('_v' + str(variables.index(item)))
+        elif kind == 'unary':
+            if item not in table:
+                return None
+            namespace[name] = table[item]
+            sources.append(name + '(' + sources.pop() + ')')
+        elif kind == 'binary':
+            right = sources.pop()
+            left = sources.pop()
+            if vectorize or backend.bin_ops[item] is bin_ops[item]:
+                # Python's own operators are faster than function calls.
+                sources.append(bin_op_sources[item].format(left, right))
+            else:
+                namespace[name] = backend.bin_ops[item]
+                sources.append(name + '(' + left + ', ' + right + ')')
+        elif kind == 'range':
+            if vectorize:
+                return None
+            n = len(item[3]) + 2
+            args = sources[-n:]
+            del sources[-n:]
+            namespace[name] = RangeOperation(*item, backend=backend)
+            sources.append(name + '(' + ', '.join(args) + ')')
+        else:
+            raise ValueError('Illegal plan step: ' + kind)
+    parameters = list('_v' + str(i) for i in range(len(variables)))
+    source = 'lambda {}: lambda {}: {}'.format(', '.join(parameters[1:]),
+                                                parameters[0], sources.pop())
+    try:
+        return eval(source, namespace)
+    except (SyntaxError, RecursionError, MemoryError):
+        # The body is too deeply nested for Python's compiler.
+        if vectorize:
+            return None
+        return lambda *values: lambda value: evaluate_plan(
+            plan, dict(zip(variables, (value,) + values)), backend)
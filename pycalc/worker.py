@@ -0,0 +1,226 @@
+'''Module containing the Worker class for evaluating expressions in the
+background.
+
+Expressions are evaluated in a separate process, so that a long computation
+neither blocks the interpreter (big integer arithmetic holds the GIL, so a
+thread would not do) nor has to run to completion when it is cancelled: the
+process is simply terminated and a fresh one is started for the next job.
+'''
+import multiprocessing
+import signal
+import threading
+import time
+from collections import deque
+
+from tree import evaluate_plan
+
+
+def serve(connection):
+    '''Evaluate (plan, bindings, backend) triples received over the connection
+    until it is closed. This is the main loop of the evaluation process.'''
+    # Ctrl-C is meant for the interpreter, which cancels jobs by itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            plan, bindings, backend = connection.recv()
+        except EOFError:
+            return
+        try:
+            if bindings is None:
+                # Computing the constants of a backend (like pi to thousands
+                # of digits) can take a while, and happens here so that it
+                # can be cancelled.
+                bindings = backend.constants
+            result = True, evaluate_plan(plan, bindings, backend)
+        except Exception as ex:
+            result = False, str(ex)
+        connection.send(result)
+
+
+class Job(object):
+    '''An expression submitted to a Worker.'''
+    def __init__(self, number, line, names, plan, free_vars, backend,
+                 line_number=None):
+        self.number = number
+        self.line = line
+        self.names = names
+        self.plan = plan
+        self.free_vars = free_vars
+        self.backend = backend
+        # Number of the line in its script (None for lines entered at the
+        # prompt)
+        self.line_number = line_number
+        # One of 'queued', 'running', 'done', 'failed' or 'cancelled'
+        self.status = 'queued'
+        self.value = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        # Whether the submitter stopped waiting for the job to finish
+        self.background = False
+        # Whether the finish callback has dealt with the job (the callback
+        # sets this while holding the submitter's lock, so that the submitter
+        # can tell under the same lock whether the result was reported)
+        self.reported = False
+        # Set once the job has left the queue for good
+        self.done = threading.Event()
+
+    def elapsed(self):
+        '''Return the number of seconds the job has been (or was) running.'''
+        if self.started is None:
+            return 0.0
+        elif self.finished is None:
+            return time.time() - self.started
+        else:
+            return self.finished - self.started
+
+
+class Worker(object):
+    '''Evaluates submitted jobs one at a time, in submission order.
+
+    Args:
+        prepare : callable
+            Called with each job right before it is evaluated. Should return a
+            dictionary with the values of the job's free variables, None if
+            they are the constants of the job's backend, or raise an
+            exception if the job cannot be evaluated.
+        finish : callable
+            Called with each job after it has been evaluated or has failed
+            (but not if it was cancelled).
+    '''
+    def __init__(self, prepare, finish):
+        self.prepare = prepare
+        self.finish = finish
+        self.jobs = deque()
+        self.current = None
+        self.counter = 0
+        self.process = None
+        self.connection = None
+        self.evaluating = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, line, names, plan, free_vars, backend, line_number=None):
+        '''Queue the postfix plan of an expression for evaluation with the
+        given numeric backend and return its Job.'''
+        with self.condition:
+            self.counter += 1
+            job = Job(self.counter, line, names, plan, free_vars, backend,
+                      line_number)
+            self.jobs.append(job)
+            self.condition.notify()
+        return job
+
+    def pending(self):
+        '''Return the list of running and queued jobs.'''
+        with self.condition:
+            current = []
+            # A cancelled job stays current until the worker thread has
+            # cleaned up after it, but it is no longer pending.
+            if self.current is not None and \
+                    self.current.status != 'cancelled':
+                current.append(self.current)
+            return current + list(self.jobs)
+
+    def cancel(self, job):
+        '''Cancel a queued or running job. Return whether the job was cancelled
+        (it may already have finished).'''
+        with self.condition:
+            if job.status == 'queued':
+                self.jobs.remove(job)
+                job.done.set()
+            elif job.status == 'running':
+                # The worker thread notices the terminated process and cleans
+                # up after it.
+                if self.evaluating:
+                    self.process.terminate()
+            else:
+                return False
+            job.status = 'cancelled'
+            return True
+
+    def close(self):
+        '''Cancel all pending jobs and stop the worker.'''
+        for job in self.pending():
+            self.cancel(job)
+        with self.condition:
+            self.jobs.append(None)
+            self.condition.notify()
+        self.thread.join()
+
+    def run(self):
+        '''Main loop of the worker thread.'''
+        self.start_process()
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                job = self.jobs.popleft()
+                if job is None:
+                    break
+                self.current = job
+                job.status = 'running'
+                job.started = time.time()
+            try:
+                bindings = self.prepare(job)
+                job.value = self.evaluate(job, bindings)
+            except Exception as ex:
+                job.error = str(ex)
+            with self.condition:
+                self.current = None
+                job.finished = time.time()
+                if job.status == 'running':
+                    job.status = 'done' if job.error is None else 'failed'
+            if job.status != 'cancelled':
+                self.finish(job)
+            job.done.set()
+        self.stop_process()
+
+    def evaluate(self, job, bindings):
+        '''Evaluate the plan of a job in the evaluation process. Return None
+        if the job is cancelled before it is sent to the process.'''
+        if self.process is not None and not self.process.is_alive():
+            self.stop_process()
+        if self.process is None:
+            self.start_process()
+        with self.condition:
+            # cancel() only terminates the process while evaluating is set, so
+            # a job cancelled before this point must not be sent at all.
+            if job.status != 'running':
+                return None
+            self.evaluating = True
+        try:
+            # Backends are pickled by name (see backends.py), so sending one
+            # is cheap.
+            self.connection.send((job.plan, bindings, job.backend))
+            success, result = self.connection.recv()
+        except (EOFError, OSError):
+            # The process was terminated (most likely by cancel()).
+            self.stop_process()
+            raise Exception('The evaluation process exited unexpectedly.')
+        finally:
+            with self.condition:
+                self.evaluating = False
+        if not success:
+            raise Exception(result)
+        return result
+
+    def start_process(self):
+        # Spawn (rather than fork) a fresh interpreter, since forking a
+        # multithreaded process is unsafe.
+        context = multiprocessing.get_context('spawn')
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve, args=(child_connection,),
+                                       daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def stop_process(self):
+        if self.process is None:
+            return
+        self.connection.close()
+        self.process.terminate()
+        self.process.join()
+        self.process = None
+        self.connection = None
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules of PyCalc import each other as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'pycalc'))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true',
+                     help='run the slow tests (like the complexity fits)')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: slow test, run with --run-slow')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+    skip = pytest.mark.skip(reason='slow test, run with --run-slow')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
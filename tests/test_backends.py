@@ -0,0 +1,116 @@
+'''Tests of the numeric backends.'''
+import pickle
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from backends import get_backend
+from cache import PlanCache
+from parser import Parser
+from tree import evaluate_plan
+
+backend_names = ['standard', 'float', 'fraction', 'decimal']
+
+
+def evaluate(line, backend, variables=None):
+    '''Parse and evaluate an expression with the given backend.'''
+    parser = Parser([], 'ans', backend)
+    parser.parse(line)
+    variables = dict(backend.constants, **(variables or {}))
+    return evaluate_plan(parser.tree.plan(), variables, backend)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0.1, Decimal('0.1000000000000000055511151231')),
+    (Fraction(1, 3), Decimal('0.3333333333333333333333333333')),
+    (Fraction(-7, 2), Decimal('-3.5')),
+    (2, Decimal(2)),
+    ])
+def test_variables_under_decimal(value, expected):
+    # Floats and fractions cannot be mixed with decimals, so they are
+    # converted to the precision of the backend.
+    backend = get_backend('decimal')
+    result = evaluate('x*1', backend, {'x': value})
+    assert type(result) is Decimal
+    assert result == expected
+    assert evaluate('x + 1/3', backend, {'x': value}) == \
+        expected + Decimal('0.3333333333333333333333333333')
+
+
+@pytest.mark.parametrize('name', ['standard', 'float'])
+def test_decimal_variables(name):
+    backend = get_backend(name)
+    value = get_backend('decimal').int_number('2.5')
+    result = evaluate('x + 0.25', backend, {'x': value})
+    assert type(result) is float
+    assert result == 2.75
+    assert evaluate('sum(x*k, k, 1, 2)', backend, {'x': value}) == 7.5
+
+
+def test_fraction_variables():
+    backend = get_backend('fraction')
+    value = get_backend('decimal').int_number('2.5')
+    assert evaluate('x + 1/4', backend, {'x': value}) == Fraction(11, 4)
+    # Fractions and floats can be mixed without conversion.
+    assert evaluate('x + 1', backend, {'x': 0.5}) == 1.5
+
+
+def test_float_prod():
+    result = evaluate('prod(k, k, 1, 20)', get_backend('float'))
+    assert type(result) is float
+    assert result == 2432902008176640000.0
+    assert type(evaluate('prod(k, k, 1, 0)', get_backend('float'))) is float
+    assert type(evaluate('sum(k, k, 1, 10)', get_backend('float'))) is float
+
+
+@pytest.mark.parametrize('name, number, real', [
+    ('standard', int, float),
+    ('float', float, float),
+    # Like irrational functions, integrals of fractions are floats.
+    ('fraction', Fraction, float),
+    ('decimal', Decimal, Decimal),
+    ])
+def test_number_types(name, number, real):
+    backend = get_backend(name)
+    assert type(evaluate('prod(k, k, 1, 20)', backend)) is number
+    assert type(evaluate('sum(k, k, 1, 0)', backend)) is number
+    assert type(evaluate('integrate(x, x, 0, 1)', backend)) is real
+
+
+def test_cache_keys(tmp_path):
+    cache = PlanCache(str(tmp_path / 'script.txt'))
+    backends = [get_backend(name) for name in backend_names] + \
+        [get_backend('decimal', 50)]
+    keys = set(cache.key('x = 1/3', backend) for backend in backends)
+    assert len(keys) == len(backends)
+    assert cache.key('x = 1/3', get_backend('decimal', 28)) == \
+        cache.key('x = 1/3', get_backend('decimal'))
+
+
+@pytest.mark.parametrize('args', [('standard',), ('float',), ('fraction',),
+                                  ('decimal',), ('decimal', 50)])
+def test_pickle(args):
+    # Backends are pickled by name, and unpickled to the cached backend.
+    backend = get_backend(*args)
+    assert pickle.loads(pickle.dumps(backend)) is backend
+    assert len(pickle.dumps(backend)) < 100
+
+
+def test_default_arguments():
+    assert get_backend('decimal', 28) is get_backend('decimal')
+    assert pickle.loads(pickle.dumps(get_backend('decimal', 28))) is \
+        get_backend('decimal')
+
+
+def test_pickled_precision():
+    backend = pickle.loads(pickle.dumps(get_backend('decimal', 50)))
+    assert backend.precision == 50
+    assert str(evaluate('1/3', backend)) == '0.' + '3' * 50
+
+
+@pytest.mark.parametrize('args', [('complex',), ('float', 10), ('decimal', 0),
+                                  ('decimal', 'many')])
+def test_illegal_backends(args):
+    with pytest.raises(ValueError):
+        get_backend(*args)
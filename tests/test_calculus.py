@@ -0,0 +1,113 @@
+'''Tests of the sum, prod and integrate functions.'''
+from math import pi
+
+import pytest
+
+import calculus
+from backends import get_backend
+from parser import ParseException, Parser
+from tree import compile_plan, evaluate_plan
+
+
+def evaluate(line, variables=None, backend=get_backend('standard')):
+    '''Parse and evaluate an expression with the given backend.'''
+    parser = Parser([], 'ans', backend)
+    parser.parse(line)
+    variables = dict(backend.constants, **(variables or {}))
+    return evaluate_plan(parser.tree.plan(), variables, backend)
+
+
+def test_sum():
+    assert evaluate('sum(k, k, 1, 100)') == 5050
+    assert evaluate('sum(1/k^2, k, 1, 10^6)') == \
+        pytest.approx(pi ** 2 / 6 - 1e-6, rel=1e-12)
+    assert evaluate('sum(k*x, k, 1, 3)', {'x': 2}) == 12
+    assert evaluate('sum(sum(j, j, 1, k), k, 1, 4)') == 20
+
+
+def test_prod():
+    value = evaluate('prod(k, k, 1, 20)')
+    assert type(value) is int
+    assert value == 2432902008176640000
+    assert evaluate('prod(k, k, 1, 30)') == 265252859812191058636308480000000
+    assert evaluate('prod(2, k, -3, 3)') == 128
+
+
+def test_empty_ranges():
+    assert evaluate('sum(k, k, 5, 4)') == 0
+    assert evaluate('prod(k, k, 5, 4)') == 1
+    assert evaluate('integrate(x, x, 1, 1)') == 0
+
+
+def test_integrate():
+    assert evaluate('integrate(sin(x), x, 0, pi)') == pytest.approx(2,
+                                                                     rel=1e-12)
+    assert evaluate('integrate(x^2, x, 0, 3)') == pytest.approx(9, rel=1e-12)
+    assert evaluate('integrate(exp(-x), x, 0, 50)') == \
+        pytest.approx(1, rel=1e-12)
+    assert evaluate('integrate(x, x, 1, 0)') == pytest.approx(-0.5, rel=1e-12)
+
+
+@pytest.mark.parametrize('line', ['integrate(1/x, x, 0, 1)',
+                                  'integrate(1/x^2, x, -1, 0)'])
+def test_divergent_integral(line):
+    with pytest.raises(ArithmeticError, match='does not converge'):
+        evaluate(line)
+
+
+@pytest.mark.parametrize('line, message', [
+    ('sum(k, k, 1, 2, 3)', 'Expected closing parenthesis, but found ,'),
+    ('sum(k, k, 1)', 'sum takes 4 arguments, but 3 were given'),
+    ('prod(k)', 'prod takes 4 arguments, but 1 were given'),
+    ('sum(k, 1, 1, 2)', 'The index of sum must be a variable'),
+    ('integrate(x, x + 1, 0, 1)', 'The index of integrate must be a variable'),
+    ('sum(k, k, 1, 2) , 3', 'Dangling tokens starting with ,'),
+    ('(1, 2)', 'Expected closing parenthesis, but found ,'),
+    ('sin(1, 2)', 'Expected closing parenthesis, but found ,'),
+    ])
+def test_arguments(line, message):
+    with pytest.raises(ParseException) as info:
+        evaluate(line)
+    assert message in str(info.value)
+
+
+@pytest.mark.parametrize('line', ['sum(k, k, 1.5, 3)', 'prod(k, k, 1, 2.5)',
+                                  'sum(k, k, -2.5, 3)'])
+def test_non_integer_bounds(line):
+    with pytest.raises(ValueError, match='must be integers'):
+        evaluate(line)
+
+
+def test_argument_parsing():
+    # The arguments of a range function may contain commas of their own.
+    assert evaluate('sum(prod(j, j, 1, k), k, 1, 4)') == 33
+    assert evaluate('sum(k, k, prod(j, j, 1, 3), 2*3)') == 6
+    assert evaluate('|sum(-k, k, 1, 3)|') == 6
+    assert evaluate('sum((k), (k), (1), (3))') == 6
+
+
+@pytest.mark.parametrize('name, body, lower, upper', [
+    ('sum', '1/k^2', 1, 10 ** 6),
+    ('sum', 'sin(k)/k', 1, 2 * 10 ** 5),
+    ('sum', 'exp(-k/1000)', -1000, 10 ** 5),
+    ('sum', '1/k', -10, 10),
+    ('prod', '1 + 1/k^2', 1, 10 ** 5),
+    ])
+def test_vectorized(name, body, lower, upper):
+    # NumPy must give the same results as the pure Python loop.
+    pytest.importorskip('numpy')
+    parser = Parser([], 'ans')
+    parser.parse(body)
+    plan = parser.tree.plan()
+    function = compile_plan(plan, ['k'])()
+    vectorized = compile_plan(plan, ['k'], vectorize=True)()
+    backend = get_backend('standard')
+    routine = calculus.range_functions[name]
+    try:
+        expected = routine(function, None, lower, upper, backend)
+    except ZeroDivisionError:
+        with pytest.raises(ZeroDivisionError):
+            routine(function, vectorized, lower, upper, backend)
+        return
+    assert routine(function, vectorized, lower, upper, backend) == \
+        pytest.approx(expected, rel=1e-12)
@@ -0,0 +1,204 @@
+'''Tests that tokenizing, parsing and evaluating grow no faster than
+O(n log n) on pathological inputs, and that no exception other than
+ParseException escapes the parser.
+
+Each test builds inputs of growing size n, measures the time (median of a few
+runs) of each stage of the pipeline (so that a slow stage is not hidden by the
+others) or the peak memory of the whole pipeline, and fits the exponent k of
+cost ~ n^k on a log-log scale. Times are divided by those of a linear
+reference loop run at the same sizes (so that the machine slowing down on
+large inputs, e.g. due to caches, does not count), and the exponent of the
+ratio has to stay below that of log n, plus some slack for noise. Peak memory
+is deterministic, so its exponent is compared with that of n log n directly.
+
+The fits take a while, so they only run with --run-slow.
+'''
+import gc
+import time
+import tracemalloc
+from math import log
+from statistics import median
+
+import pytest
+
+from parser import Parser, ParseException
+from tree import evaluate_plan
+
+sizes = [1000, 3162, 10000, 31623, 100000]
+repeats = 5
+slack = 0.25
+
+
+def pipeline(line, variables):
+    '''Parse a line, then evaluate and print its tree in every way there is.'''
+    parser = Parser([], 'ans')
+    parser.parse(line)
+    tree = parser.tree
+    assert tree.set_vars(variables)
+    value = tree.evaluate()
+    repr(tree)
+    assert evaluate_plan(tree.plan(), variables) == value
+    return value
+
+
+def stages(line, variables):
+    '''Return functions running each stage of the pipeline on a line.'''
+    parser = Parser([], 'ans')
+    parser.parse(line)
+    tree = parser.tree
+    assert tree.set_vars(variables)
+    return {
+            'parse': lambda: Parser([], 'ans').parse(line),
+            'evaluate': tree.evaluate,
+            'repr': lambda: repr(tree),
+            'plan': lambda: evaluate_plan(tree.plan(), variables)
+            }
+
+
+def elapsed(function):
+    '''Return the median running time of function() over a few runs.'''
+    durations = []
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return median(durations)
+
+
+def reference(n):
+    '''Return a function doing a linear amount of work much like that of the
+    pipeline: allocating n small objects, then walking over them.'''
+    def loop():
+        nodes = list([i] for i in range(n))
+        return sum(len(node) for node in nodes)
+    return loop
+
+
+def relative_costs(functions):
+    '''Time functions of the sizes, relative to the reference loop timed at
+    the same sizes.'''
+    return list(elapsed(function) / elapsed(reference(n))
+                for n, function in zip(sizes, functions))
+
+
+def peak_memory(function):
+    '''Return the peak memory allocated while running function().'''
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def exponent(costs):
+    '''Fit cost = c * n^k to the costs at the sizes by least squares on a
+    log-log scale, and return k.'''
+    xs = list(log(n) for n in sizes)
+    ys = list(log(cost) for cost in costs)
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    covariance = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    variance = sum((x - x_mean) ** 2 for x in xs)
+    return covariance / variance
+
+
+# The largest exponents allowed: that of n log n (or of log n, relative to a
+# linear loop), plus slack.
+max_exponent = exponent(list(n * log(n) for n in sizes)) + slack
+max_relative_exponent = exponent(list(log(n) for n in sizes)) + slack
+
+# name -> (function building an input of size n, variables, value)
+cases = {
+         'nested parentheses': (lambda n: '(' * n + '1' + ')' * n, {}, 1),
+         'long sum': (lambda n: '+'.join(['1'] * n), {}, None),
+         'factorial chain': (lambda n: '0' + '!' * n, {}, 1),
+         'negation chain': (lambda n: '-' * n + '1', {}, None),
+         'nested absolute values': (lambda n: '|' * n + '-1' + '|' * n, {},
+                                    1),
+         'long identifier': (lambda n: 'x' * n + '+1', None, 2)
+         }
+
+
+def case_input(name, n):
+    '''Return the line and the variables of a case at size n.'''
+    build, variables, _ = cases[name]
+    if variables is None:
+        variables = {'x' * n: 1}
+    return build(n), variables
+
+
+def run_case(name, n):
+    line, variables = case_input(name, n)
+    return lambda: pipeline(line, variables)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('stage', ['parse', 'evaluate', 'repr', 'plan'])
+@pytest.mark.parametrize('name', sorted(cases))
+def test_time(name, stage):
+    costs = relative_costs(stages(*case_input(name, n))[stage] for n in sizes)
+    assert exponent(costs) < max_relative_exponent, costs
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('name', sorted(cases))
+def test_memory(name):
+    costs = list(peak_memory(run_case(name, n)) for n in sizes)
+    assert exponent(costs) < max_exponent, costs
+
+
+@pytest.mark.parametrize('name', sorted(cases))
+def test_value(name):
+    _, _, value = cases[name]
+    n = sizes[-1]
+    result = run_case(name, n)()
+    if value is None:
+        # The long sum adds up n ones, and the negation chain negates 1 n
+        # times.
+        value = n if name == 'long sum' else (-1) ** n
+    assert result == value
+
+
+# Malformed inputs of size n, which have to raise a ParseException (and
+# nothing else, like a RecursionError).
+malformed = {
+             'unclosed parentheses': lambda n: '(' * n + '1',
+             'unopened parentheses': lambda n: '1' + ')' * n,
+             'unclosed absolute values': lambda n: '|' * n + '1',
+             'dangling operators': lambda n: '1' + '+' * n,
+             'missing operand': lambda n: '-' * n,
+             'dangling factorials': lambda n: '!' * n,
+             'empty parentheses': lambda n: '(' * n + ')' * n,
+             'juxtaposed operands': lambda n: ' '.join(['1'] * n)
+             }
+
+
+@pytest.mark.parametrize('name', sorted(malformed))
+def test_only_parse_exceptions(name):
+    for n in sizes:
+        line = malformed[name](n)
+        parser = Parser([], 'ans')
+        with pytest.raises(ParseException):
+            parser.parse(line)
+
+
+def fail(line):
+    '''Return a function parsing a malformed line.'''
+    def parse():
+        try:
+            Parser([], 'ans').parse(line)
+        except ParseException:
+            pass
+    return parse
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('name', sorted(malformed))
+def test_malformed_time(name):
+    costs = relative_costs(fail(malformed[name](n)) for n in sizes)
+    assert exponent(costs) < max_relative_exponent, costs
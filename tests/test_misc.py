@@ -0,0 +1,78 @@
+'''Tests of abbreviating huge numbers in results and the vars table.'''
+import sys
+from fractions import Fraction
+
+import pytest
+
+from interpreter import PyCalcInterpreter
+from misc import format_value
+
+
+def abbreviated(value, precision=16):
+    '''The expected abbreviation of an integer, worked out from its digits.'''
+    digits = str(abs(value))
+    sign = '-' if value < 0 else ''
+    return sign + digits[0] + '.' + digits[1:precision] + '...e+' + \
+        str(len(digits) - 1)
+
+
+@pytest.mark.parametrize('value', [10 ** 100 - 1, -(10 ** 100 - 1), 2 ** 332,
+                                   1, 0, -1, 12345])
+def test_short_integers(value):
+    # Integers with at most 100 digits are shown in full.
+    assert format_value(value) == str(value)
+
+
+@pytest.mark.parametrize('value', [10 ** 100, -(10 ** 100), 10 ** 100 + 1,
+                                   2 ** 333, -(2 ** 333), 3 ** 1000,
+                                   10 ** 200 - 1])
+def test_long_integers(value):
+    assert len(str(abs(value))) > 100
+    assert format_value(value) == abbreviated(value)
+
+
+def test_max_digits():
+    assert format_value(10 ** 30 - 1, 30) == str(10 ** 30 - 1)
+    assert format_value(10 ** 30, 30) == abbreviated(10 ** 30)
+    assert format_value(10 ** 30, 30, 5) == abbreviated(10 ** 30, 5)
+
+
+def test_other_values():
+    assert format_value(2.5) == '2.5'
+    assert format_value(True) == 'True'
+    assert format_value(1e300) == '1e+300'
+
+
+def test_fractions():
+    numerator = 10 ** 150 + 1
+    denominator = 3 ** 300
+    assert format_value(Fraction(numerator, denominator)) == \
+        abbreviated(numerator) + '/' + abbreviated(denominator)
+    assert format_value(Fraction(-1, 10 ** 200)) == \
+        '-1/' + abbreviated(10 ** 200)
+    assert format_value(Fraction(7, 10 ** 100 - 1)) == \
+        '7/' + str(10 ** 100 - 1)
+    assert format_value(Fraction(10 ** 100, 1)) == abbreviated(10 ** 100)
+    assert format_value(Fraction(1, 3)) == '1/3'
+
+
+@pytest.mark.skipif(not hasattr(sys, 'get_int_max_str_digits'),
+                    reason='integer string conversion is not limited')
+def test_show_full_value(capsys):
+    limit = sys.get_int_max_str_digits()
+    if not limit:
+        pytest.skip('integer string conversion is not limited')
+    value = 7 ** (limit * 2)
+    pycalc = PyCalcInterpreter('', '>>> ', '', {'x': value})
+    try:
+        pycalc.do_show('x')
+    finally:
+        pycalc.close()
+    sys.set_int_max_str_digits(0)
+    try:
+        digits = str(value)
+    finally:
+        sys.set_int_max_str_digits(limit)
+    assert len(digits) > limit
+    assert capsys.readouterr().out == 'x =\n    ' + digits + '\n'
+    assert sys.get_int_max_str_digits() == limit
@@ -0,0 +1,70 @@
+'''Differential tests comparing the parser with the recursive descent parser it
+replaced (see reference_parser.py).
+
+Random strings of tokens are parsed by both parsers, which have to build the
+same trees and assign to the same names, or raise the same ParseException at
+the same span. The only intended difference is that an empty expression is
+reported as an illegal assignment instead of crashing the reference parser, so
+those lines are left out.
+'''
+import random
+
+import pytest
+
+import parser
+import reference_parser
+
+illegal_vars = ['del']
+default_variable = 'ans'
+
+# Tokens of the language the reference parser knows (so no ',' or range
+# functions), plus some that are not tokens on their own.
+tokens = ['1', '2', '3.5', '1e2', 'x', 'y_1', 'del', 'exp', 'log', '+', '-',
+          '*', '/', '^', '!', '(', ')', '|', '=', ' ', '2x', '.']
+
+cases = 20000
+max_tokens = 12
+
+
+def result(module, line):
+    '''Parse a line and summarize the outcome.'''
+    line_parser = module.Parser(illegal_vars, default_variable)
+    try:
+        line_parser.parse(line)
+    except module.ParseException as ex:
+        return 'error', ex.message, ex.expression, ex.token, ex.start, ex.end
+    except Exception as ex:
+        return 'exception', str(ex)
+    return 'tree', repr(line_parser.tree), line_parser.names
+
+
+def random_line(rng):
+    return ''.join(rng.choice(tokens)
+                   for _ in range(rng.randint(1, max_tokens)))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_lines(seed):
+    rng = random.Random(seed)
+    compared = 0
+    for _ in range(cases):
+        line = random_line(rng)
+        if not line.split('=')[-1].strip():
+            continue
+        assert result(parser, line) == result(reference_parser, line), line
+        compared += 1
+    assert compared > cases // 2
+
+
+@pytest.mark.parametrize('line', [
+    '1+2*3', '-2^2', '2^-3^2', '|1-|2-3||', '3!!', 'exp(log|2|)',
+    'x = y = 1/2/3', '(1', '1)', '|1', '1 2', 'del', 'exp 1', '2^', '()',
+    '1+()', 'x = ', '= 1'
+    ])
+def test_lines(line):
+    if not line.split('=')[-1].strip():
+        # Empty expressions are reported differently on purpose.
+        with pytest.raises(Exception, match='Illegal assignment'):
+            parser.Parser(illegal_vars, default_variable).parse(line)
+    else:
+        assert result(parser, line) == result(reference_parser, line)
@@ -0,0 +1,178 @@
+'''Tests of running scripts with the "run" command, and of caching their
+parsed lines.'''
+import json
+import os
+import pickle
+
+import pytest
+
+from backends import get_backend
+from cache import PlanCache, decode_plan, encode_plan
+from interpreter import PyCalcInterpreter
+from parser import Parser
+
+
+@pytest.fixture
+def pycalc():
+    pycalc = PyCalcInterpreter('', '>>> ', '', {})
+    # Wait for every line of a script.
+    pycalc.timeout = None
+    yield pycalc
+    pycalc.close()
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    '''List of the lines parsed by any Parser.'''
+    lines = []
+    parse = Parser.parse
+
+    def counting_parse(self, line):
+        lines.append(line)
+        return parse(self, line)
+
+    monkeypatch.setattr(Parser, 'parse', counting_parse)
+    return lines
+
+
+def write(path, *lines):
+    path.write_text(''.join(line + '\n' for line in lines))
+    return str(path)
+
+
+def test_run(pycalc, tmp_path, capsys):
+    script = write(tmp_path / 'script.pc', 'a = 2', 'b = a^10 # comment', '',
+                   'c = unknown + 1', 'd = (1 +', 'del a', 'e = b + 1')
+    pycalc.do_run(script)
+    output = capsys.readouterr().out
+    assert pycalc.variables == {'b': 1024, 'e': 1025}
+    assert 'Runtime error on line 4: Encountered unknown variable.' in output
+    assert 'Runtime error on line 5: Expected token after +' in output
+
+
+def test_run_itself(pycalc, tmp_path, capsys):
+    script = tmp_path / 'self.pc'
+    write(script, 'a = 1', 'run ' + str(script), 'b = a + 1')
+    pycalc.do_run(str(script))
+    output = capsys.readouterr().out
+    assert 'Runtime error: The script is already running' in output
+    assert pycalc.variables == {'a': 1, 'b': 2}
+    assert not pycalc.scripts
+
+
+def test_run_each_other(pycalc, tmp_path, capsys):
+    first = tmp_path / 'first.pc'
+    second = tmp_path / 'second.pc'
+    write(first, 'run ' + str(second), 'x = 1')
+    write(second, 'run ' + str(first), 'y = 2')
+    pycalc.do_run(str(first))
+    output = capsys.readouterr().out
+    assert output.count('The script is already running') == 1
+    assert pycalc.variables == {'x': 1, 'y': 2}
+
+
+script_lines = ['a = 2', 'b = a^10 + 0.5', 'c = sum(k * b, k, 1, 3)']
+values = {'a': 2, 'b': 1024.5, 'c': 6147.0}
+
+
+def cache_path(script):
+    directory, name = os.path.split(script)
+    return os.path.join(directory, '.' + name + '.pycalccache')
+
+
+def test_warm_run(pycalc, tmp_path, parsed):
+    script = write(tmp_path / 'script.pc', *script_lines)
+    pycalc.do_run(script)
+    assert parsed == script_lines
+    del parsed[:]
+    pycalc.variables.clear()
+    pycalc.do_run(script)
+    assert parsed == []
+    assert pycalc.variables == values
+
+
+def test_edited_line(pycalc, tmp_path, parsed):
+    script = write(tmp_path / 'script.pc', *script_lines)
+    pycalc.do_run(script)
+    del parsed[:]
+    write(tmp_path / 'script.pc', 'a = 3', *script_lines[1:])
+    pycalc.do_run(script)
+    assert parsed == ['a = 3']
+    assert pycalc.variables['b'] == 3 ** 10 + 0.5
+
+
+@pytest.mark.parametrize('contents', [
+    b'\x00garbage', b'[1, 2, 3]', b'{"key": "value"',
+    pickle.dumps({'key': ('names', 'plan', 'free_vars')})
+    ])
+def test_corrupt_cache(pycalc, tmp_path, parsed, contents):
+    script = write(tmp_path / 'script.pc', *script_lines)
+    with open(cache_path(script), 'wb') as file:
+        file.write(contents)
+    pycalc.do_run(script)
+    assert parsed == script_lines
+    assert pycalc.variables == values
+    with open(cache_path(script)) as file:
+        assert len(json.load(file)) == len(script_lines)
+
+
+def test_corrupt_entries(pycalc, tmp_path, parsed):
+    script = write(tmp_path / 'script.pc', *script_lines)
+    pycalc.do_run(script)
+    with open(cache_path(script)) as file:
+        entries = json.load(file)
+    corrupt = [None, [['a'], [['value', 'int']], []],
+               [['b'], [['call', 'print']], []]]
+    for key, entry in zip(sorted(entries), corrupt):
+        entries[key] = entry
+    with open(cache_path(script), 'w') as file:
+        json.dump(entries, file)
+    del parsed[:]
+    pycalc.variables.clear()
+    pycalc.do_run(script)
+    assert len(parsed) == len(corrupt)
+    assert pycalc.variables == values
+
+
+def test_deleted_lines(pycalc, tmp_path):
+    script = write(tmp_path / 'script.pc', *script_lines)
+    pycalc.do_run(script)
+    write(tmp_path / 'script.pc', *script_lines[:2])
+    pycalc.do_run(script)
+    with open(cache_path(script)) as file:
+        entries = json.load(file)
+    cache = PlanCache(script)
+    standard = get_backend('standard')
+    assert sorted(entries) == sorted(cache.key(line, standard)
+                                     for line in script_lines[:2])
+
+
+def test_pickle_is_not_loaded(pycalc, tmp_path):
+    # A crafted cache file must not be able to run code.
+    marker = tmp_path / 'marker'
+
+    class Exploit(object):
+        def __reduce__(self):
+            return os.mkdir, (str(marker),)
+
+    script = write(tmp_path / 'script.pc', *script_lines)
+    with open(cache_path(script), 'wb') as file:
+        pickle.dump(Exploit(), file)
+    pycalc.do_run(script)
+    assert not marker.exists()
+    assert pycalc.variables == values
+
+
+@pytest.mark.parametrize('backend', [('standard',), ('float',), ('fraction',),
+                                     ('decimal',), ('decimal', 50)])
+def test_encoded_plan(backend):
+    backend = get_backend(*backend)
+    parser = Parser([], 'ans', backend)
+    parser.parse('1 + 2.5 * 0.1 - 1e300 / sum(k^2 + x, k, 1, 10) ^ 3')
+    plan = parser.tree.plan()
+    decoded = decode_plan(json.loads(json.dumps(encode_plan(plan))), backend)
+    assert decoded == plan
+    assert list(map(type, decoded)) == list(map(type, plan))
+    values = list(item for kind, item in decoded if kind == 'value')
+    originals = list(item for kind, item in plan if kind == 'value')
+    assert list(map(type, values)) == list(map(type, originals))
@@ -0,0 +1,149 @@
+'''Tests of the Worker class, driven directly with stub prepare and finish
+callbacks.'''
+import threading
+import time
+
+import pytest
+
+from backends import get_backend
+from worker import Worker
+
+standard = get_backend('standard')
+
+# Plan of 3^30000000, which takes long enough to be cancelled while running
+slow_plan = [('value', 3), ('value', 30000000), ('binary', '^')]
+
+
+def number_plan(i):
+    return [('value', i), ('value', 1), ('binary', '+')]
+
+
+class Callbacks(object):
+    '''Stub callbacks recording the jobs they are called with.'''
+    def __init__(self):
+        self.prepared = []
+        self.finished = []
+        self.lock = threading.Lock()
+
+    def prepare(self, job):
+        with self.lock:
+            self.prepared.append(job)
+        return {}
+
+    def finish(self, job):
+        with self.lock:
+            self.finished.append(job)
+
+
+@pytest.fixture
+def callbacks():
+    return Callbacks()
+
+
+@pytest.fixture
+def worker(callbacks):
+    worker = Worker(callbacks.prepare, callbacks.finish)
+    yield worker
+    if worker.thread.is_alive():
+        worker.close()
+
+
+def submit(worker, plan, line='line'):
+    return worker.submit(line, ['ans'], plan, [], standard)
+
+
+def wait_until(condition, timeout=10):
+    '''Wait until condition() holds, and fail if it does not in time.'''
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_submission_order(worker, callbacks):
+    jobs = list(submit(worker, number_plan(i)) for i in range(20))
+    for job in jobs:
+        assert job.done.wait(10)
+    assert callbacks.finished == jobs
+    assert list(job.value for job in jobs) == list(range(1, 21))
+    assert all(job.status == 'done' for job in jobs)
+
+
+def test_failed_job(worker, callbacks):
+    job = submit(worker, [('value', 1), ('value', 0), ('binary', '/')])
+    assert job.done.wait(10)
+    assert job.status == 'failed'
+    assert 'division by zero' in job.error
+    assert callbacks.finished == [job]
+
+
+def test_cancel_queued_job(worker, callbacks):
+    slow = submit(worker, slow_plan)
+    queued = submit(worker, number_plan(1))
+    assert worker.cancel(queued)
+    assert queued.status == 'cancelled'
+    assert queued.done.is_set()
+    assert worker.pending() == [slow]
+    assert worker.cancel(slow)
+    after = submit(worker, number_plan(2))
+    assert after.done.wait(10)
+    assert after.value == 3
+    assert callbacks.finished == [after]
+    assert queued not in callbacks.prepared
+
+
+def test_cancel_running_job(worker, callbacks):
+    slow = submit(worker, slow_plan)
+    wait_until(lambda: worker.evaluating)
+    assert slow.status == 'running'
+    start = time.time()
+    assert worker.cancel(slow)
+    # The cancelled job is no longer pending, even while the worker is still
+    # cleaning up after it.
+    assert worker.pending() == []
+    after = submit(worker, number_plan(2))
+    assert after.done.wait(10)
+    assert time.time() - start < 5
+    assert slow.done.is_set()
+    assert slow.status == 'cancelled'
+    assert after.value == 3
+    assert callbacks.finished == [after]
+
+
+def test_cancel_before_evaluation(callbacks):
+    # A job cancelled after prepare() but before being sent to the process is
+    # not evaluated at all.
+    def prepare(job):
+        worker.cancel(job)
+        return {}
+
+    worker = Worker(prepare, callbacks.finish)
+    try:
+        job = submit(worker, slow_plan)
+        assert job.done.wait(10)
+        assert job.status == 'cancelled'
+        assert job.value is None
+        assert callbacks.finished == []
+    finally:
+        worker.close()
+
+
+def test_cancel_finished_job(worker):
+    job = submit(worker, number_plan(1))
+    assert job.done.wait(10)
+    assert not worker.cancel(job)
+    assert job.status == 'done'
+
+
+def test_close(worker, callbacks):
+    job = submit(worker, number_plan(1))
+    slow = submit(worker, slow_plan)
+    queued = submit(worker, number_plan(2))
+    assert job.done.wait(10)
+    wait_until(lambda: worker.evaluating)
+    worker.close()
+    assert not worker.thread.is_alive()
+    assert worker.process is None
+    assert slow.status == 'cancelled'
+    assert queued.status == 'cancelled'
+    assert callbacks.finished == [job]